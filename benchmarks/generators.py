@@ -0,0 +1,98 @@
+"""Synthetic .dopy workloads for the benchmark suite"""
+
+from pathlib import Path
+from typing import Set, Union
+
+
+def long_file(functions: int = 2000) -> str:
+    """A flat module with many small functions, loops and branches"""
+    blocks = []
+    for i in range(functions):
+        blocks.append(
+            f"def function_{i}(items) do\n"
+            f"    total = 0\n"
+            f"    for item in items do\n"
+            f"        if item % {i % 7 + 2} == 0 do\n"
+            f"            total += item  # accumulate\n"
+            f"        end\n"
+            f"    end\n"
+            f"    return total\n"
+            f"end\n"
+        )
+    return "\n".join(blocks)
+
+
+def generated_module(functions: int = 20000) -> str:
+    """A large machine generated module of lookup tables, megabytes of source"""
+    blocks = []
+    for i in range(functions):
+        table = ", ".join(f'"key_{i}_{j}": {i * j}' for j in range(8))
+        blocks.append(
+            f"def lookup_{i}(key) do\n"
+            f"    table = {{{table}}}\n"
+            f"    if key in table do\n"
+            f"        return table[key]\n"
+            f"    end\n"
+            f"    return None\n"
+            f"end\n"
+        )
+    return "\n".join(blocks)
+
+
+def deep_nesting(depth: int = 400, repeat: int = 5) -> str:
+    """do/end blocks nested depth levels deep, repeat times over"""
+    blocks = []
+    for _ in range(repeat):
+        opening = [f"if level_{i} do" for i in range(depth)]
+        closing = ["end"] * depth
+        blocks.append("\n".join(opening + ["pass"] + closing))
+    return "\n".join(blocks)
+
+
+def string_heavy(lines: int = 300, items: int = 300) -> str:
+    """Long data literal lines full of quotes and escapes"""
+    literal = ", ".join(f'\'item {i}\', "it\\"s {i} do"' for i in range(items))
+    return "\n".join(f"data_{i} = [{literal}]" for i in range(lines))
+
+
+def import_graph(root: Union[str, Path], width: int = 20, depth: int = 5) -> Path:
+    """
+    Write a project of width * depth modules where every module imports all
+    modules of the next level, plus a main.dopy importing the first level.
+    Returns the path of main.dopy.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    body = "def value() do\n    return 1\nend\n"
+    for level in range(depth):
+        for i in range(width):
+            imports = ""
+            if level + 1 < depth:
+                imports = "".join(f"import mod_{level + 1}_{j}\n" for j in range(width))
+            (root / f"mod_{level}_{i}.dopy").write_text(imports + body)
+
+    main = root / "main.dopy"
+    main.write_text(
+        "".join(f"import mod_0_{i}\n" for i in range(width)) + "x = mod_0_0.value()\n"
+    )
+    return main
+
+
+def skewed_tree(
+    root: Union[str, Path], small: int = 120, large_functions: int = 1200
+) -> Set[Path]:
+    """
+    Write small modules of a few kilobytes and one generated module about
+    fifty times the size of each. Returns their paths.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    files = set()
+    for i in range(small):
+        path = root / f"small_{i}.dopy"
+        path.write_text(generated_module(25))
+        files.add(path)
+    large = root / "large.dopy"
+    large.write_text(generated_module(large_functions))
+    files.add(large)
+    return files
@@ -0,0 +1,243 @@
+"""
+Transpiler benchmark suite.
+
+    python -m benchmarks.run                       # run and print timings
+    python -m benchmarks.run --save baseline.json  # store a JSON baseline
+    python -m benchmarks.run --compare baseline.json --threshold 0.1
+
+With --compare the exit code is 1 when any benchmark got slower than the
+baseline by more than the threshold (a fraction, 0.1 meaning 10%).
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from benchmarks import generators
+from dopy import __version__
+from dopy.core import Dopy
+from dopy.transpiler.collector import DopyImportCollector
+from dopy.transpiler.processor import DopyProcessor
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class ArrivalOrderProcessor(DopyProcessor):
+    """
+    Starts files in the order they come, as before size-aware scheduling.
+    A set of paths comes in no particular order, so each instance shuffles
+    the files with its own seed. The baseline of size-aware scheduling.
+    """
+
+    def __init__(self, *args, seed: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seed = seed
+
+    def _sizes(
+        self, files: Set[Path], known: Optional[Dict[Path, int]] = None
+    ) -> List[Tuple[Path, int]]:
+        sized = DopyProcessor._sizes(files, known)
+        random.Random(self.seed).shuffle(sized)
+        return sized
+
+
+class SimulatedWork:
+    """
+    A task taking time in proportion to the size of its file without
+    holding the GIL, so the effect of scheduling shows on any machine
+    """
+
+    def __init__(self, seconds_per_byte: float):
+        self.seconds_per_byte = seconds_per_byte
+
+    def __call__(self, file_path: Path) -> None:
+        time.sleep(os.stat(file_path).st_size * self.seconds_per_byte)
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Time func repeat times"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "repeat": repeat,
+    }
+
+
+def run_benchmarks(
+    workdir: Path, repeat: int, scale: float, only: Optional[List[str]] = None
+) -> Dict[str, Dict[str, float]]:
+    """Generate the workloads under workdir and time every benchmark"""
+
+    def n(value: int) -> int:
+        return max(1, int(value * scale))
+
+    dopy = Dopy()
+    sources = {
+        "long_file": generators.long_file(n(2000)),
+        "deep_nesting": generators.deep_nesting(n(400)),
+        "string_heavy": generators.string_heavy(n(300), n(300)),
+    }
+    graphs = {
+        "wide": generators.import_graph(workdir / "wide", width=n(200), depth=2),
+        "deep": generators.import_graph(workdir / "deep", width=3, depth=n(60)),
+    }
+
+    benchmarks = {}
+    for name, source in sources.items():
+        benchmarks[f"preprocess.{name}"] = lambda source=source: dopy.preprocess(source)
+    # Reading, transpiling and writing a multi-megabyte file in one go
+    generated = workdir / "generated_module.dopy"
+    generated.write_text(generators.generated_module(n(20000)))
+    benchmarks["process_file.generated_module"] = lambda: dopy.process_file(
+        str(generated), str(generated.with_suffix(".py"))
+    )
+    for name, main in graphs.items():
+        benchmarks[f"collect_all_imports.{name}_graph"] = (
+            lambda main=main: DopyImportCollector(main.parent).collect_all_imports(main)
+        )
+        files = DopyImportCollector(main.parent).collect_all_imports(main)
+        benchmarks[f"process_all.{name}_graph"] = (
+            lambda files=files: DopyProcessor().process_all(files)
+        )
+
+    # One large module among many small ones, started first or wherever it
+    # falls, a new order on every run so the median is over orders
+    skewed = generators.skewed_tree(
+        workdir / "skewed", small=n(120), large_functions=n(1200)
+    )
+    work = SimulatedWork(0.25 / max(os.stat(path).st_size for path in skewed))
+    seeds = itertools.count()
+    for name, make in [
+        ("largest_first", DopyProcessor),
+        (
+            "arrival_order",
+            lambda **kwargs: ArrivalOrderProcessor(seed=next(seeds), **kwargs),
+        ),
+    ]:
+        benchmarks[f"schedule.skewed_tree.{name}"] = lambda make=make: make(
+            max_workers=4, backend="thread"
+        ).map_files(work, skewed)
+        # Real transpilation, only faster given more than one core
+        benchmarks[f"process_all.skewed_tree.{name}"] = lambda make=make: make(
+            backend="process"
+        ).process_all(skewed)
+
+    # End to end in a fresh interpreter, so every run imports from scratch
+    e2e_main = graphs["wide"]
+    benchmarks["run_without_files.wide_graph"] = lambda: subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from dopy.run import run_without_files; "
+            "run_without_files(sys.argv[1])",
+            str(e2e_main),
+        ],
+        check=True,
+        cwd=REPO_ROOT,
+    )
+
+    results = {}
+    for name, func in benchmarks.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = measure(func, repeat)
+        print(f"{name:<42} {results[name]['median'] * 1000:>10.2f} ms")
+    return results
+
+
+def compare(
+    baseline: Dict[str, Dict[str, float]],
+    current: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """Print a comparison table and return the names that regressed"""
+    regressions = []
+    print(f"\n{'benchmark':<42} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(current):
+        if name not in baseline:
+            continue
+        old = baseline[name]["median"]
+        new = current[name]["median"]
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<42} {old * 1000:>8.2f}ms {new * 1000:>8.2f}ms "
+            f"{change:>+7.1%}{flag}"
+        )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="dopy transpiler benchmarks")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark")
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiplier for workload sizes, below 1 for a quick run",
+    )
+    parser.add_argument(
+        "--only", nargs="*", help="Only run benchmarks whose name starts with these"
+    )
+    parser.add_argument("--save", metavar="FILE", help="Write results as JSON")
+    parser.add_argument(
+        "--compare", metavar="FILE", help="Compare against a saved JSON baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Allowed slowdown before a benchmark counts as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="dopy-bench-") as workdir:
+        results = run_benchmarks(Path(workdir), args.repeat, args.scale, args.only)
+
+    if args.save:
+        report = {
+            "meta": {
+                "dopy": __version__,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "scale": args.scale,
+            },
+            "results": results,
+        }
+        Path(args.save).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.compare:
+        report = json.loads(Path(args.compare).read_text())
+        if report["meta"].get("scale") != args.scale:
+            print("Warning: baseline was recorded with a different --scale")
+        regressions = compare(report["results"], results, args.threshold)
+        if regressions:
+            print(
+                f"\n{len(regressions)} benchmark(s) regressed beyond "
+                f"{args.threshold:.0%}"
+            )
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+CLI startup benchmark.
+
+    python -m benchmarks.startup            # time `dopy --check` against `python -c pass`
+    python -m benchmarks.startup --top 20   # list the 20 most expensive imports
+
+Each mode runs in a fresh interpreter with -X importtime, so the numbers
+include every import the CLI pulls in before doing any work. --check and
+--stdout are timed once on their own and once with a warm `dopy daemon`
+answering them.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.run import REPO_ROOT
+from dopy.daemon import DopyDaemon, forward
+
+SMALL_SOURCE = "def f(x) do\n    return x\nend\n"
+
+# What the installed `dopy` console script runs, without -m pulling in runpy
+ENTRY_POINT = "import sys; from dopy.cli import main; sys.exit(main())"
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """Map each imported module to its (self, cumulative) import time in us"""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports[name.strip()] = (int(self_us), int(cumulative_us))
+    return imports
+
+
+def time_command(
+    args: List[str], repeat: int, socket_path: Optional[Path] = None
+) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    """
+    Median wall time of a fresh interpreter running args, and its imports.
+    The CLI talks to the daemon on socket_path, if one is given.
+    """
+    env = dict(os.environ, DOPY_SOCKET=str(socket_path or "/nonexistent"))
+    timings = []
+    imports = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", *args],
+            capture_output=True,
+            text=True,
+            cwd=REPO_ROOT,
+            env=env,
+        )
+        timings.append(time.perf_counter() - start)
+        imports = parse_importtime(result.stderr)
+    return statistics.median(timings), imports
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="dopy CLI startup benchmark")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per command")
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of slowest imports to list"
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="dopy-startup-") as workdir:
+        target = Path(workdir) / "small.dopy"
+        target.write_text(SMALL_SOURCE)
+
+        commands = {
+            "python -c pass": ["-c", "pass"],
+            "dopy --help": ["-c", ENTRY_POINT, "--help"],
+            "dopy --check": ["-c", ENTRY_POINT, "--check", str(target)],
+            "dopy --stdout": ["-c", ENTRY_POINT, "--stdout", str(target)],
+        }
+        results = {
+            name: time_command(command, args.repeat)
+            for name, command in commands.items()
+        }
+
+        # The same calls again, answered by a warm daemon
+        daemon = DopyDaemon(Path(workdir) / "dopy.sock")
+        daemon.bind()
+        server = threading.Thread(target=daemon.serve_forever, daemon=True)
+        server.start()
+        try:
+            for name in ["dopy --check", "dopy --stdout"]:
+                results[f"{name} (daemon)"] = time_command(
+                    commands[name], args.repeat, daemon.socket_path
+                )
+            # What an editor integration talking to the socket pays per call
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                forward("stdout", target, socket_path=daemon.socket_path)
+                timings.append(time.perf_counter() - start)
+            round_trip = statistics.median(timings)
+        finally:
+            daemon.shutdown()
+            daemon.close()
+
+    bare, bare_imports = results["python -c pass"]
+    for name, (wall, imports) in results.items():
+        print(
+            f"{name:<24} {wall * 1000:>8.2f} ms  {wall / bare:>5.2f}x bare  "
+            f"{len(imports):>4} imports"
+        )
+
+    print(f"{'daemon round trip':<24} {round_trip * 1000:>8.2f} ms")
+
+    # Imports the interpreter doesn't do on its own, by cumulative cost
+    _, check_imports = results["dopy --check"]
+    extra = sorted(
+        (
+            (cumulative, self_us, name)
+            for name, (self_us, cumulative) in check_imports.items()
+            if name not in bare_imports
+        ),
+        reverse=True,
+    )
+    print(f"\n{'dopy --check imports':<40} {'self':>10} {'cumulative':>12}")
+    for cumulative, self_us, name in extra[: args.top]:
+        print(f"{name:<40} {self_us / 1000:>8.2f}ms {cumulative / 1000:>10.2f}ms")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
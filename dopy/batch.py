@@ -0,0 +1,209 @@
+"""
+Batch mode: --check, --stdout and --keep over many files in one process.
+
+Targets may be .dopy files, directories (searched recursively) and glob
+patterns. The expanded set is handed to DopyProcessor, which spreads the
+files over threads or worker processes, and the result of every file is
+collected into one summary.
+"""
+
+import glob
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dopy import profiling
+from dopy.cache import TranspileCache
+from dopy.core import Diagnostic, Dopy, _write_if_changed, transpile
+from dopy.exceptions import DopyFileError
+from dopy.transpiler.processor import DopyProcessor, TaskResult
+
+_GLOB_CHARS = frozenset("*?[")
+
+
+def _walk(directory: Path) -> List[Path]:
+    """Every .dopy file under directory, skipping hidden dirs and caches"""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+        found.extend(Path(root) / name for name in files if name.endswith(".dopy"))
+    return found
+
+
+def expand_targets(targets: Sequence[str]) -> Tuple[List[Path], List[str]]:
+    """
+    Resolve files, directories and glob patterns to a sorted list of
+    unique .dopy files. Also returns an error for each target that
+    matched nothing usable.
+    """
+    files = set()
+    errors = []
+    for target in targets:
+        if _GLOB_CHARS & set(target):
+            matches = [Path(m) for m in glob.glob(target, recursive=True)]
+            found = [m for m in matches if m.suffix == ".dopy" and m.is_file()]
+            for directory in (m for m in matches if m.is_dir()):
+                found.extend(_walk(directory))
+            if not found:
+                errors.append(f"No .dopy files match {target}")
+        elif os.path.isdir(target):
+            found = _walk(Path(target))
+            if not found:
+                errors.append(f"No .dopy files in {target}")
+        elif not os.path.exists(target):
+            errors.append(f"Target file not found: {target}")
+            continue
+        elif not target.endswith(".dopy"):
+            errors.append(f"Target file must have .dopy extension: {target}")
+            continue
+        else:
+            found = [Path(target)]
+        files.update(path.resolve() for path in found)
+    return sorted(files), errors
+
+
+def check(file_path: Path) -> List[Diagnostic]:
+    """Every syntax error in one file"""
+    with open(file_path, "r") as f:
+        contents = f.read()
+    with profiling.phase("check", files=1, nbytes=len(contents)):
+        return Dopy().collect_errors(contents)
+
+
+class FormatTo:
+    """
+    Transpiles and formats a file into output_dir, mirroring its place
+    under root. A class rather than a closure so worker processes can
+    receive it.
+    """
+
+    def __init__(self, root: Path, output_dir: Path, pep8_strict: bool = False):
+        self.root = root
+        self.output_dir = output_dir
+        self.pep8_strict = pep8_strict
+
+    def __call__(self, file_path: Path) -> None:
+        if self.pep8_strict:
+            from autopep8 import fix_code
+        else:
+            from dopy.pep8 import format_code as fix_code
+
+        with open(file_path, "r") as f:
+            contents = f.read()
+        with profiling.phase("transpile", files=1, nbytes=len(contents)):
+            processed = transpile(contents)
+        with profiling.phase("format", files=1, nbytes=len(processed)):
+            formatted = fix_code(processed)
+
+        output_path = self.output_dir / file_path.relative_to(self.root)
+        output_path = output_path.with_suffix(".py")
+        with profiling.phase("write", files=1, nbytes=len(formatted)):
+            try:
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                _write_if_changed(output_path, formatted.encode("utf-8"))
+            except OSError as e:
+                raise DopyFileError(str(output_path), "write", e)
+
+
+def _common_root(files: List[Path]) -> Path:
+    if len(files) == 1:
+        return files[0].parent
+    return Path(os.path.commonpath([str(path.parent) for path in files]))
+
+
+def _report_json(
+    files: List[Path], results: Dict[Path, TaskResult], errors: List[str]
+) -> None:
+    """Print the outcome of a batch check as a single JSON document"""
+    import json
+
+    diagnostics = []
+    failed = 0
+    for path in files:
+        found, error = results[path]
+        if error is not None:
+            errors.append(f"{path}: {error}")
+        if found or error is not None:
+            failed += 1
+        for diagnostic in found or ():
+            diagnostics.append({"path": str(path), **diagnostic.to_dict()})
+    report = {
+        "files": len(files),
+        "ok": len(files) - failed,
+        "failed": failed,
+        "diagnostics": diagnostics,
+        "errors": errors,
+    }
+    print(json.dumps(report, indent=2))
+
+
+def run_batch(
+    mode: str,
+    targets: Sequence[str],
+    output_dir: Optional[str] = None,
+    pep8_strict: bool = False,
+    cache: Optional[TranspileCache] = None,
+    max_workers: Optional[int] = None,
+    json_output: bool = False,
+) -> int:
+    """
+    Run mode ("check", "stdout" or "keep") over every file targets expand
+    to, print a line per failure and a summary. --check reports every
+    syntax error of every file, as JSON with json_output. Returns the exit
+    status, 1 if any target or file failed.
+    """
+    if mode == "stdout" and output_dir is None:
+        print("Error: --stdout with several targets needs --output-dir")
+        return 1
+    if mode == "stdout" and pep8_strict:
+        try:
+            import autopep8  # noqa: F401
+        except ImportError:
+            print(
+                "Error: --pep8-strict needs autopep8, "
+                "install it with: pip install 'dopy-syntax[pep8]'"
+            )
+            return 1
+
+    start = time.perf_counter()
+    files, errors = expand_targets(targets)
+
+    results: Dict[Path, TaskResult] = {}
+    if files:
+        processor = DopyProcessor(max_workers=max_workers, cache=cache)
+        if mode == "check":
+            task = check
+        elif mode == "stdout":
+            root = _common_root(files)
+            task = FormatTo(root, Path(output_dir).resolve(), pep8_strict)
+        else:
+            task = processor.transpile_file
+        results = processor.map_files(task, files)
+
+    # A file failed if its task raised, or found syntax errors
+    failed = [
+        path for path in files if results[path][1] is not None or results[path][0]
+    ]
+    if json_output:
+        _report_json(files, results, errors)
+        return 1 if failed or errors else 0
+
+    for error in errors:
+        print(f"Error: {error}")
+    for path in failed:
+        found, error = results[path]
+        if error is not None:
+            print(f"✗ {path}: {error}")
+        for diagnostic in found or ():
+            print(
+                f"✗ {path}:{diagnostic.line}:{diagnostic.column}: {diagnostic.message}"
+            )
+
+    verb = {"check": "Checked", "stdout": "Formatted", "keep": "Transpiled"}[mode]
+    elapsed = (time.perf_counter() - start) * 1000
+    print(
+        f"{verb} {len(files)} file(s) in {elapsed:.1f} ms: "
+        f"{len(files) - len(failed)} ok, {len(failed)} failed"
+    )
+    return 1 if failed or errors else 0
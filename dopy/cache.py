@@ -0,0 +1,246 @@
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+from array import array
+from pathlib import Path
+from types import CodeType
+from typing import Optional, Tuple, Union
+
+from dopy import __version__
+
+# Flags word of a PEP 552 pyc header: hash based and checked against the source
+_PYC_CHECKED_HASH = (0b11).to_bytes(4, "little")
+
+# Default upper bound for the on-disk size of a single cache
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+def default_cache_dir() -> Path:
+    """Return $XDG_CACHE_HOME/dopy, falling back to ~/.cache/dopy"""
+    base = os.environ.get("XDG_CACHE_HOME")
+    if not base:
+        base = Path.home() / ".cache"
+    return Path(base) / "dopy"
+
+
+class DiskCache:
+    """
+    Size bounded key/value store of bytes on disk.
+
+    Entries live in <cache_dir>/<namespace>/<key[:2]>/<key>. Writes go to a
+    temporary file that is renamed into place, so concurrent readers and
+    writers (for example parallel CLI invocations) only ever see complete
+    entries. Hits refresh the entry mtime, and once the total size exceeds
+    max_size the least recently used entries are removed.
+    """
+
+    # Fraction of max_size to shrink to when evicting, to avoid thrashing
+    LOW_WATER = 0.75
+
+    def __init__(
+        self,
+        namespace: str,
+        cache_dir: Union[str, Path, None] = None,
+        max_size: int = DEFAULT_MAX_SIZE,
+    ):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        self.directory = Path(cache_dir) / namespace
+        self.max_size = max_size
+        # Bytes written since the last eviction check, None before the first
+        self._written = None
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the entry stored under key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            # Missing, or evicted by another process while we looked at it
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store data under key, ignoring failures since caching is best effort"""
+        path = self._path(key)
+        temp_path = path.with_name(f".{key}.{os.getpid()}.{os.urandom(4).hex()}")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, "xb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        if self._written is None or self._written > self.max_size // 16:
+            self._written = 0
+            self.evict()
+        self._written += len(data)
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits max_size"""
+        entries = []
+        total = 0
+        try:
+            shards = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for shard in shards:
+            try:
+                files = list(os.scandir(shard.path))
+            except OSError:
+                continue
+            for entry in files:
+                # Skip in-flight temporary files of other writers
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_size:
+            return
+
+        entries.sort()
+        target = self.max_size * self.LOW_WATER
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+class TranspileCache:
+    """
+    Cache of transpiled Python source keyed by a hash of the .dopy source
+    bytes and the transpiler version, so unchanged files skip
+    Dopy.preprocess entirely.
+
+    Alongside it lives a bytecode cache of compiled modules, one entry per
+    source path, stored with a PEP 552 hash based pyc header. The code is
+    marshalled together with the source line table of the module (see
+    dopy.sourcemap). Entries are validated against the source hash, so warm
+    imports skip both transpilation and compilation.
+
+    Lastly, the import graph DopyImportCollector found for each project
+    root is kept, so unchanged files aren't parsed again.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path, None] = None,
+        max_size: int = DEFAULT_MAX_SIZE,
+    ):
+        self.store = DiskCache("transpiled", cache_dir, max_size)
+        self.bytecode = DiskCache("bytecode", cache_dir, max_size)
+        self.imports = DiskCache("imports", cache_dir, max_size)
+
+    @staticmethod
+    def key(source: bytes) -> str:
+        digest = hashlib.sha256(__version__.encode())
+        digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    @staticmethod
+    def code_key(path: str) -> str:
+        digest = hashlib.sha256(__version__.encode())
+        digest.update(importlib.util.MAGIC_NUMBER)
+        digest.update(os.fsencode(path))
+        return digest.hexdigest()
+
+    @staticmethod
+    def graph_key(project_root: Union[str, Path]) -> str:
+        digest = hashlib.sha256(__version__.encode())
+        digest.update(b"\0")
+        digest.update(os.fsencode(os.path.abspath(project_root)))
+        return digest.hexdigest()
+
+    def get(self, source: bytes) -> Optional[str]:
+        """Return the cached transpilation of source, or None on a miss"""
+        data = self.store.get(self.key(source))
+        if data is None:
+            return None
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+
+    def put(self, source: bytes, processed: str) -> None:
+        """Remember the transpilation of source"""
+        self.store.put(self.key(source), processed.encode("utf-8"))
+
+    def get_code(self, path: str, source: bytes) -> Optional[CodeType]:
+        """Return the cached code object for path if it was compiled from source"""
+        cached = self.get_code_and_lines(path, source)
+        return None if cached is None else cached[0]
+
+    def get_code_and_lines(
+        self, path: str, source: bytes
+    ) -> Optional[Tuple[CodeType, array]]:
+        """Return the cached code object for path and its source line table"""
+        data = self.bytecode.get(self.code_key(path))
+        if (
+            data is None
+            or data[:4] != importlib.util.MAGIC_NUMBER
+            or data[4:8] != _PYC_CHECKED_HASH
+            or data[8:16] != importlib.util.source_hash(source)
+        ):
+            return None
+        try:
+            code, lines = marshal.loads(data[16:])
+            line_map = array("I")
+            line_map.frombytes(lines)
+        except (EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(code, CodeType):
+            return None
+        return code, line_map
+
+    def put_code(
+        self,
+        path: str,
+        source: bytes,
+        code: CodeType,
+        line_map: Optional[array] = None,
+    ) -> None:
+        """Remember the code object compiled for path from source"""
+        data = bytearray(importlib.util.MAGIC_NUMBER)
+        data += _PYC_CHECKED_HASH
+        data += importlib.util.source_hash(source)
+        lines = b"" if line_map is None else line_map.tobytes()
+        data += marshal.dumps((code, lines))
+        self.bytecode.put(self.code_key(path), bytes(data))
+
+    def get_import_graph(self, project_root: Union[str, Path]) -> Optional[dict]:
+        """Return the import graph saved for project_root, or None on a miss"""
+        data = self.imports.get(self.graph_key(project_root))
+        if data is None:
+            return None
+        try:
+            graph = json.loads(data)
+        except ValueError:
+            return None
+        return graph if isinstance(graph, dict) else None
+
+    def put_import_graph(self, project_root: Union[str, Path], graph: dict) -> None:
+        """Remember the import graph of project_root"""
+        data = json.dumps(graph, separators=(",", ":")).encode("utf-8")
+        self.imports.put(self.graph_key(project_root), data)
@@ -1,12 +1,16 @@
 import argparse
+import os
+import sys
 from pathlib import Path
+from typing import List, Optional, Tuple
+from dopy import profiling
 from dopy.help import HELP_TEXT
-from dopy.core import Dopy
+from dopy.core import Dopy, transpile
 from dopy.exceptions import DopyUnmatchedBlockError
-from dopy.run import run_without_files, run_with_files
-import autopep8
 
-dopy = Dopy()
+# Everything else is imported by the mode that needs it, so that quick
+# modes like --check and --help don't pay for the formatter, the
+# transpiler pools or the import machinery at startup.
 
 
 def resolve_target_path(target: str) -> Path:
@@ -45,6 +49,136 @@ def resolve_target_path(target: str) -> Path:
     return target_path
 
 
+def is_batch(targets: List[str], output_dir: Optional[str] = None) -> bool:
+    """Whether targets ask for batch mode rather than a single module"""
+    if output_dir is not None or len(targets) != 1:
+        return True
+    target = targets[0]
+    return bool(set("*?[") & set(target)) or os.path.isdir(target)
+
+
+def check_file(target_path: Path) -> Tuple[int, str]:
+    """
+    Validate the syntax of target_path, returning exit status and a message
+    with a line for every error found
+    """
+    with open(target_path, "r") as f:
+        contents = f.read()
+    with profiling.phase("check", files=1, nbytes=len(contents)):
+        diagnostics = Dopy().collect_errors(contents)
+    if not diagnostics:
+        return 0, f"✓ {target_path} syntax is valid"
+    return 1, "\n".join(
+        f"✗ Syntax Error in {target_path}: "
+        f"{str(DopyUnmatchedBlockError(diagnostic.message))}"
+        for diagnostic in diagnostics
+    )
+
+
+def format_file(target_path: Path, pep8_strict: bool = False) -> Tuple[int, str]:
+    """Transpile and format target_path, returning exit status and output"""
+    if pep8_strict:
+        try:
+            import autopep8
+        except ImportError:
+            return 1, (
+                "Error: --pep8-strict needs autopep8, "
+                "install it with: pip install 'dopy-syntax[pep8]'"
+            )
+    else:
+        from dopy.pep8 import format_code
+
+    with open(target_path, "r") as f:
+        contents = f.read()
+    try:
+        with profiling.phase("transpile", files=1, nbytes=len(contents)):
+            processed = transpile(contents)
+        if pep8_strict:
+            with profiling.phase("autopep8", files=1, nbytes=len(processed)):
+                processed_with_pep8 = autopep8.fix_code(processed)
+        else:
+            with profiling.phase("format", files=1, nbytes=len(processed)):
+                processed_with_pep8 = format_code(processed)
+        return 0, processed_with_pep8
+    except Exception as e:
+        return 1, f"Error preprocessing code: {e}"
+
+
+def run_target(args: argparse.Namespace) -> int:
+    """Carry out the mode selected on the command line for args.target"""
+    if args.batch:
+        from dopy.batch import run_batch
+        from dopy.cache import TranspileCache
+
+        mode = "check" if args.check else "stdout" if args.stdout else "keep"
+        return run_batch(
+            mode,
+            args.targets,
+            output_dir=args.output_dir,
+            pep8_strict=args.pep8_strict,
+            cache=None if args.no_cache else TranspileCache(),
+            max_workers=args.jobs,
+            json_output=args.json,
+        )
+
+    try:
+        # Resolve the target path
+        target_path = resolve_target_path(args.target)
+
+        if args.check or args.stdout:
+            status, output = None, None
+            if args.use_daemon:
+                from dopy import daemon
+
+                response = daemon.forward(
+                    "check" if args.check else "stdout",
+                    target_path,
+                    pep8_strict=args.pep8_strict,
+                )
+                if response is not None:
+                    status, output = response
+            if status is None:
+                if args.check:
+                    status, output = check_file(target_path)
+                else:
+                    status, output = format_file(target_path, args.pep8_strict)
+            print(output)
+            return status
+
+        from dopy.cache import TranspileCache
+
+        cache = None if args.no_cache else TranspileCache()
+
+        if args.keep:
+            from dopy.run import run_with_files
+
+            run_with_files(main_module=target_path, cache=cache, max_workers=args.jobs)
+            return 0
+
+        if args.watch:
+            from dopy.watch import DopyWatcher
+
+            DopyWatcher(target_path, cache=cache, max_workers=args.jobs).run()
+            return 0
+
+        # Default case: run without keeping files
+        from dopy.run import run_without_files
+
+        run_without_files(main_module=target_path, cache=cache)
+        return 0
+
+    except Exception as e:
+        # Failures of the program being run get its traceback, in .dopy lines
+        sourcemap = sys.modules.get("dopy.sourcemap")
+        if sourcemap is not None and sourcemap.in_dopy_code(e):
+            sys.excepthook(type(e), e, sourcemap.program_traceback(e))
+        elif isinstance(e, (FileNotFoundError, ValueError)):
+            print(f"Error: {e}")
+        else:
+            print(f"Error: An unexpected error occurred: {e}")
+        return 1
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Python without indentation", add_help=False
@@ -58,6 +192,12 @@ def main() -> None:
         action="store_true",
         help="Transpile modules in place, preserving dir structure",
     )
+    group.add_argument(
+        "--watch",
+        "-w",
+        action="store_true",
+        help="Transpile in place like --keep, then rebuild changed modules",
+    )
     group.add_argument(
         "--stdout",
         "-s",
@@ -69,62 +209,104 @@ def main() -> None:
     )
     group.add_argument("--help", "-h", action="store_true", help="Show help text")
 
-    parser.add_argument("target", nargs="?", help="Target dopy module name")
+    parser.add_argument(
+        "--pep8-strict",
+        action="store_true",
+        help="Format --stdout output with autopep8 instead of the built in emitter",
+    )
+
+    parser.add_argument(
+        "--output-dir",
+        "-o",
+        metavar="DIR",
+        help="With --stdout, write each formatted module under DIR instead",
+    )
+
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="With --check, report every error of every target as JSON",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always transpile from scratch, bypassing the on-disk cache",
+    )
+
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Do the work in this process even when a dopy daemon is running",
+    )
+
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Transpile with up to N parallel workers",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print a per-phase timing breakdown when done",
+    )
+    parser.add_argument(
+        "--profile-json",
+        metavar="FILE",
+        help="Write the per-phase timing breakdown to FILE as JSON",
+    )
+
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        metavar="target",
+        help="Dopy modules, directories or glob patterns, or 'daemon'",
+    )
     args = parser.parse_args()
 
     if args.help:
         print(HELP_TEXT)
         return
 
-    if not args.target:
+    if not args.targets:
         print("Error: Target module not specified.")
         return 1
 
-    try:
-        # Resolve the target path
-        target_path = resolve_target_path(args.target)
-
-        if args.check:
-            with open(target_path, "r") as f:
-                contents = f.read()
-            try:
-                dopy.validate_syntax(contents)
-                print(f"✓ {target_path} syntax is valid")
-                return 0
-            except DopyUnmatchedBlockError as e:
-                print(f"✗ Syntax Error in {target_path}: {str(e)}")
-                return 1
+    if args.targets == ["daemon"]:
+        from dopy.daemon import DopyDaemon
 
-        if args.keep:
-            run_with_files(main_module=target_path)
-            return 0
+        return DopyDaemon().run()
 
-        if args.stdout:
-            with open(target_path, "r") as f:
-                contents = f.read()
-            try:
-                processed = dopy.preprocess(contents)
-                processed_with_pep8 = autopep8.fix_code(processed)
-                print(processed_with_pep8)
-                return 0
-            except Exception as e:
-                print(f"Error preprocessing code: {e}")
-                return 1
-
-        # Default case: run without keeping files
-        run_without_files(main_module=target_path)
-        return 0
-
-    except FileNotFoundError as e:
-        print(f"Error: {e}")
+    args.target = args.targets[0]
+    if args.json and not args.check:
+        print("Error: --json only works with --check")
         return 1
-    except ValueError as e:
-        print(f"Error: {e}")
-        return 1
-    except Exception as e:
-        print(f"Error: An unexpected error occurred: {e}")
+    # JSON reports come from batch mode, even for a single module
+    args.batch = is_batch(args.targets, args.output_dir) or args.json
+    if args.batch and not (args.check or args.stdout or args.keep):
+        print("Error: Several targets only work with --check, --stdout or --keep")
         return 1
 
+    profiler = None
+    if args.profile or args.profile_json:
+        profiler = profiling.enable()
+    # A profile is of the work done here, so it never goes to the daemon
+    args.use_daemon = not args.no_daemon and profiler is None
+
+    try:
+        return run_target(args)
+    finally:
+        if profiler is not None:
+            profiling.disable()
+            if args.profile:
+                print(profiler.report(), file=sys.stderr)
+            if args.profile_json:
+                profiler.write_json(args.profile_json)
+
 
 if __name__ == "__main__":
     exit(main())
@@ -1,39 +1,260 @@
+import mmap
+import os
+import re
+import stat
+from array import array
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, List, Optional, Union
+
 from dopy.exceptions import DopyFileError, DopyUnmatchedBlockError
 
+# A backslash escape, consumed whole so the escaped char is never a quote
+_ESCAPE = re.compile(r"\\.", re.DOTALL)
 
-class Dopy:
+
+def _split_source_lines(lines):
     """
-    Dopy is a preprocesor for python that removes the need for strict
-    indentation by supplanting them with indentation agnostic do..end blocks
+    Turn an iterable of text chunks (typically lines that may still carry
+    their line ending) into bare source lines, treating \\r\\n, \\r and \\n
+    as line breaks the same way preprocess normalizes them.
+    """
+    for chunk in lines:
+        if chunk.endswith("\n"):
+            chunk = chunk[:-2] if chunk.endswith("\r\n") else chunk[:-1]
+        elif chunk.endswith("\r"):
+            chunk = chunk[:-1]
+
+        if "\r" in chunk or "\n" in chunk:
+            yield from chunk.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        else:
+            yield chunk
+
+
+def _mapped_lines(data, input_file):
+    """
+    Split UTF-8 source bytes, typically an mmap, on \\n and decode one line
+    at a time, so the whole file is never copied or decoded at once. A \\n
+    byte can't occur inside a multibyte UTF-8 sequence. Lines still carry
+    any \\r, like the result of str.split("\\n").
+    """
+    find = data.find
+    start = 0
+    try:
+        while True:
+            end = find(b"\n", start)
+            if end == -1:
+                yield data[start:].decode("utf-8")
+                return
+            yield data[start:end].decode("utf-8")
+            start = end + 1
+    except UnicodeDecodeError as e:
+        raise DopyFileError(input_file, "read", e)
+
+
+# Output lines encoded and written per buffered write
+_WRITE_BATCH = 256
+
+
+def _write_lines(out, lines) -> None:
+    """Write lines joined by \\n to the binary file out, in large batches"""
+    separator = b""
+    while True:
+        batch = list(islice(lines, _WRITE_BATCH))
+        if not batch:
+            return
+        out.write(separator + "\n".join(batch).encode("utf-8"))
+        separator = b"\n"
+
+
+# Bytes compared at a time when checking whether an output changed
+_COMPARE_CHUNK = 1024 * 1024
+
+
+def _same_contents(path, other_path) -> bool:
+    """Whether two files hold the same bytes, False if either is missing"""
+    try:
+        if os.stat(path).st_size != os.stat(other_path).st_size:
+            return False
+        with open(path, "rb") as f, open(other_path, "rb") as other:
+            while True:
+                chunk = f.read(_COMPARE_CHUNK)
+                if chunk != other.read(_COMPARE_CHUNK):
+                    return False
+                if not chunk:
+                    return True
+    except OSError:
+        return False
+
+
+@contextmanager
+def _atomic_output(output_file, binary=False):
+    """
+    Open a sibling temporary file for writing and move it over output_file
+    only once the block completes, so a failed transpilation never leaves a
+    truncated output behind. If output_file already holds exactly what was
+    written it is left alone, keeping its mtime and anything keyed on it
+    such as __pycache__ entries and file watchers. A symlinked output is
+    written through to its target, and an existing output keeps its mode.
+    """
+    output_file = os.path.realpath(output_file)
+    directory, name = os.path.split(output_file)
+    temp_file = os.path.join(directory, f".{name}.{os.getpid()}.{os.urandom(4).hex()}")
+    try:
+        with open(temp_file, "xb" if binary else "x") as f:
+            yield f
+        if _same_contents(temp_file, output_file):
+            os.remove(temp_file)
+        else:
+            try:
+                os.chmod(temp_file, stat.S_IMODE(os.stat(output_file).st_mode))
+            except FileNotFoundError:
+                pass
+            os.replace(temp_file, output_file)
+    except BaseException:
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+        raise
+
+
+def _write_if_changed(output_file, data: bytes) -> bool:
+    """
+    Atomically write data to output_file unless it already holds exactly
+    data. Returns whether the file was written. Unlike _atomic_output, an
+    unchanged file doesn't even cost a temporary file.
+    """
+    try:
+        if os.stat(output_file).st_size == len(data):
+            with open(output_file, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    with _atomic_output(output_file, binary=True) as f:
+        f.write(data)
+    return True
+
+
+class _QuoteIndex:
+    """
+    Precomputed quote/escape state for a single line.
+
+    Escapes are blanked out once with a single regex pass, keeping every
+    position in place, so each query is a pair of C level str.count calls
+    instead of a character by character walk in Python. A position is inside
+    a string when the text before it holds an odd number of unescaped single
+    or double quotes.
     """
 
+    __slots__ = ("_line",)
+
+    def __init__(self, line):
+        if "'" not in line and '"' not in line:
+            # No quotes at all, nothing can be inside a string
+            self._line = None
+        elif "\\" in line:
+            self._line = _ESCAPE.sub("\0\0", line)
+        else:
+            self._line = line
+
+    def in_string(self, pos):
+        """Check if position is inside a string, with slice semantics for pos"""
+        line = self._line
+        if line is None:
+            return False
+        if pos < 0:
+            pos = max(len(line) + pos, 0)
+        return line.count("'", 0, pos) % 2 == 1 or line.count('"', 0, pos) % 2 == 1
+
+
+class Diagnostic:
+    """A problem found in a source, at a 1-based line and column"""
+
+    UNMATCHED_END = "unmatched-end"
+    UNCLOSED_DO = "unclosed-do"
+
+    __slots__ = ("line", "column", "kind", "message")
+
+    def __init__(self, line: int, column: int, kind: str, message: str):
+        self.line = line
+        self.column = column
+        self.kind = kind
+        self.message = message
+
+    def __eq__(self, other):
+        if not isinstance(other, Diagnostic):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return (
+            f"Diagnostic({self.line}, {self.column}, {self.kind!r}, {self.message!r})"
+        )
+
+    def to_dict(self) -> Dict[str, Union[int, str]]:
+        return {
+            "line": self.line,
+            "column": self.column,
+            "kind": self.kind,
+            "message": self.message,
+        }
+
+
+def _unclosed_message(line_num: int, line_text=None) -> str:
+    """Message for a 'do' block still open at the end of the source"""
+    if line_text is None:
+        return f"Unclosed 'do' block starting at line {line_num}"
+    return (
+        f"Unclosed 'do' block starting at line {line_num}: "
+        f"'{line_text(line_num).strip()}'"
+    )
+
+
+def _source_line(data, line_num: int) -> str:
+    """Line line_num of UTF-8 source bytes, only needed to report errors"""
+    code = bytes(data).decode("utf-8", errors="replace")
+    code = code.replace("\r\n", "\n").replace("\r", "\n")
+    return code.split("\n")[line_num - 1]
+
+
+class _BlockState:
+    """
+    State of a single transpilation: the indentation level and the line
+    numbers of the 'do' blocks still open, innermost last. It lives for one
+    call only, so a Dopy engine is never mutated and can be shared.
+    """
+
+    __slots__ = ("indent_level", "open_blocks")
+
     def __init__(self):
         self.indent_level = 0
-        self.block_stack = []
-
-    def _count_unescaped_quotes(self, s, quote):
-        """Count unescaped quotes in a string"""
-        count = 0
-        i = 0
-        while i < len(s):
-            if s[i] == "\\":
-                i += 2
-                continue
-            if s[i] == quote:
-                count += 1
-            i += 1
-        return count
+        self.open_blocks = array("I")
+
+
+class Dopy:
+    """
+    Dopy is a preprocesor for python that removes the need for strict
+    indentation by supplanting them with indentation agnostic do..end blocks
+
+    An engine holds no state between or during calls, so a single instance
+    can be shared by any number of threads and asyncio tasks.
+    """
 
     def _is_in_string(self, line, pos):
         """Check if position is inside a string"""
-        single_count = self._count_unescaped_quotes(line[:pos], "'")
-        double_count = self._count_unescaped_quotes(line[:pos], '"')
-        return (single_count % 2 == 1) or (double_count % 2 == 1)
+        return _QuoteIndex(line).in_string(pos)
 
-    def validate_syntax(self, code):
-        """Validate do/end block matching"""
-        lines = code.split("\n")
-        self.block_stack = []
+    def _scan_blocks(self, lines):
+        """
+        Match do/end blocks, yielding a Diagnostic for every unmatched
+        'end' as it is reached, then one for each 'do' block still open at
+        the end, innermost first. A stray 'end' is skipped, so the blocks
+        around it keep matching and later errors are still found.
+        """
+        # Line and column of every open block, innermost last
+        open_blocks = []
 
         for line_num, line in enumerate(lines, 1):
             stripped = line.strip()
@@ -50,62 +271,195 @@ class Dopy:
             if self._is_in_string(stripped, len(stripped) - 3):
                 continue
 
+            indent = len(line) - len(line.lstrip())
+
             # Check for blocks
             if stripped.startswith("end"):
-                if not self.block_stack:
-                    raise DopyUnmatchedBlockError(f"Unmatched 'end' at line {line_num}")
-                self.block_stack.pop()
+                if not open_blocks:
+                    yield Diagnostic(
+                        line_num,
+                        indent + 1,
+                        Diagnostic.UNMATCHED_END,
+                        f"Unmatched 'end' at line {line_num}",
+                    )
+                else:
+                    open_blocks.pop()
 
             if stripped.endswith("do") and "#" not in stripped:
-                self.block_stack.append((stripped, line_num))
+                open_blocks.append((line_num, indent + len(stripped) - 1))
 
             # comment case
             do_index = stripped.find("do")
             comment_start_index = stripped.find("#")
 
             if do_index != -1 and do_index < comment_start_index:
-                self.block_stack.append((stripped, line_num))
+                open_blocks.append((line_num, indent + do_index + 1))
 
-        if self.block_stack:
-            unclosed = self.block_stack[-1]
-            raise DopyUnmatchedBlockError(
-                f"Unclosed 'do' block starting at line {unclosed[1]}: '{unclosed[0]}'"
+        for line_num, column in reversed(open_blocks):
+            yield Diagnostic(
+                line_num,
+                column,
+                Diagnostic.UNCLOSED_DO,
+                _unclosed_message(line_num, lambda n: lines[n - 1]),
             )
 
-    def _process_line(self, line) -> str:
-        """process a single line"""
+    def validate_syntax(self, code):
+        """Validate do/end block matching"""
+        for diagnostic in self._scan_blocks(code.split("\n")):
+            raise DopyUnmatchedBlockError(diagnostic.message)
+
+    def collect_errors(self, code) -> List[Diagnostic]:
+        """
+        Validate do/end block matching without stopping at the first
+        error. Returns every problem found, in source order.
+        """
+        if "\r" in code:
+            code = code.replace("\r\n", "\n").replace("\r", "\n")
+        diagnostics = list(self._scan_blocks(code.split("\n")))
+        return sorted(diagnostics, key=lambda d: (d.line, d.column))
+
+    def _process_line(self, line, state) -> str:
+        """process a single line, tracking indentation in state"""
         if not line.strip():
             return None
 
         stripped = line.strip()
 
         if stripped.startswith("#"):
-            return "    " * self.indent_level + stripped
+            return "    " * state.indent_level + stripped
 
         if stripped.endswith("do"):
             if "#" in stripped:
                 return stripped
             doless_line = stripped.replace(" do", ":")
-            result = "    " * self.indent_level + doless_line.strip()
-            self.indent_level += 1
+            result = "    " * state.indent_level + doless_line.strip()
+            state.indent_level += 1
             return result
         elif stripped.find("do") < stripped.find("#"):
             # both comment and do in the same line
             doless_line = stripped.replace(" do", ":")
-            result = "    " * self.indent_level + doless_line.strip()
-            self.indent_level += 1
+            result = "    " * state.indent_level + doless_line.strip()
+            state.indent_level += 1
             return result
         elif stripped.endswith("end") and "#" not in stripped:
-            self.indent_level -= 1
+            state.indent_level -= 1
             return ""
         else:
-            return "    " * self.indent_level + stripped
+            return "    " * state.indent_level + stripped
 
-    def preprocess(self, code):
-        """Main preprocessing method"""
-        # Reset state
-        self.indent_level = 0
-        self.block_stack = []
+    def _transpile_lines(self, lines, line_map=None, line_text=None):
+        """
+        Validate and transpile lines in a single pass.
+
+        Yields output lines as they are produced and raises
+        DopyUnmatchedBlockError on the first unmatched 'end', or once the
+        input is exhausted with a 'do' block still open. Validation and
+        emission follow validate_syntax and _process_line exactly. Every
+        line that isn't blank gives exactly one output line, and when
+        line_map is given its source line number is appended to it.
+
+        Open blocks are tracked by line number only. line_text, a function
+        from a line number to the source line, quotes the line of an
+        unclosed block in its error; streams that can't look back omit it.
+        """
+        state = _BlockState()
+        open_blocks = state.open_blocks
+
+        for line_num, line in enumerate(lines, 1):
+            stripped = line.strip()
+
+            # Blank lines are neither validated nor emitted
+            if not stripped:
+                continue
+            if line_map is not None:
+                line_map.append(line_num)
+
+            # Full line comments keep the current indentation
+            if stripped[0] == "#":
+                yield "    " * state.indent_level + stripped
+                continue
+
+            do_index = stripped.find("do")
+            comment_index = stripped.find("#")
+            ends_with_do = stripped.endswith("do")
+
+            # Block matching, skipped when the tail of the line is in a string
+            if not _QuoteIndex(stripped).in_string(len(stripped) - 3):
+                if stripped.startswith("end"):
+                    if not open_blocks:
+                        raise DopyUnmatchedBlockError(
+                            f"Unmatched 'end' at line {line_num}"
+                        )
+                    open_blocks.pop()
+
+                if ends_with_do and comment_index == -1:
+                    open_blocks.append(line_num)
+
+                if do_index != -1 and do_index < comment_index:
+                    open_blocks.append(line_num)
+
+            # Emission
+            if ends_with_do:
+                if comment_index != -1:
+                    yield stripped
+                    continue
+                yield "    " * state.indent_level + stripped.replace(" do", ":").strip()
+                state.indent_level += 1
+            elif do_index < comment_index:
+                # both comment and do in the same line
+                yield "    " * state.indent_level + stripped.replace(" do", ":").strip()
+                state.indent_level += 1
+            elif stripped.endswith("end") and comment_index == -1:
+                state.indent_level -= 1
+                yield ""
+            else:
+                yield "    " * state.indent_level + stripped
+
+        if open_blocks:
+            raise DopyUnmatchedBlockError(_unclosed_message(open_blocks[-1], line_text))
+
+    def preprocess(self, code, line_map=None):
+        """
+        Main preprocessing method. If line_map, an array('I'), is given,
+        the source line number of every output line is appended to it.
+        """
+        # normalize line endings, no copies needed in the common case
+        if "\r" in code:
+            code = code.replace("\r\n", "\n").replace("\r", "\n")
+
+        lines = code.split("\n")
+        return "\n".join(self._transpile_lines(lines, line_map, lambda n: lines[n - 1]))
+
+    def line_table(self, code) -> array:
+        """
+        The line map preprocess fills for code, without transpiling it.
+        Used when the transpiled source itself comes from a cache.
+        """
+        if "\r" in code:
+            code = code.replace("\r\n", "\n").replace("\r", "\n")
+        return array(
+            "I", (n for n, line in enumerate(code.split("\n"), 1) if line.strip())
+        )
+
+    def preprocess_stream(self, lines):
+        """
+        Streaming preprocessing method.
+
+        Takes any iterable of source lines, such as a text file object, and
+        yields transpiled lines as soon as their indentation is known. Joining
+        the result with newlines gives the same output as preprocess. Syntax
+        errors are raised when reached, after the lines before them have
+        been yielded. An unclosed block error can't quote the line of the
+        block, as the stream has moved past it.
+        """
+        return self._transpile_lines(_split_source_lines(lines))
+
+    def preprocess_legacy(self, code):
+        """
+        Two pass preprocessing: validate_syntax over the whole source, then
+        _process_line over every line. Kept for comparison with preprocess.
+        """
+        state = _BlockState()
 
         # normalize line endings
         code = code.replace("\r\n", "\n").replace("\r", "\n")
@@ -117,7 +471,7 @@ class Dopy:
         # Process each line
         result = []
         for line in lines:
-            processed = self._process_line(line)
+            processed = self._process_line(line, state)
             if processed is None:
                 continue
             result.append(processed)
@@ -125,20 +479,57 @@ class Dopy:
         return "\n".join(result)
 
     def process_file(self, input_file, output_file=None):
-        """Process a file and optionally write to output file"""
+        """
+        Process a file and optionally write to output file.
+
+        The file is memory mapped and its lines decoded one at a time as
+        the transpiler consumes them. Line endings are only normalized if
+        the file holds a \\r at all, and the output is written in large
+        buffered batches.
+        """
         try:
-            with open(input_file, "r") as f:
-                code = f.read()
+            f = open(input_file, "rb")
         except Exception as e:
             raise DopyFileError(input_file, "read", e)
 
-        processed = self.preprocess(code)
+        with f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # Empty files and pipes can't be mapped
+                try:
+                    data = f.read()
+                except OSError as e:
+                    raise DopyFileError(input_file, "read", e)
 
-        if output_file:
             try:
-                with open(output_file, "w") as f:
-                    f.write(processed)
-            except Exception as e:
-                raise DopyFileError(output_file, "write", e)
-            return True
-        return processed
+                source_lines = _mapped_lines(data, input_file)
+                if data.find(b"\r") != -1:
+                    source_lines = _split_source_lines(source_lines)
+                lines = self._transpile_lines(
+                    source_lines, line_text=lambda n: _source_line(data, n)
+                )
+                if not output_file:
+                    return "\n".join(lines)
+
+                try:
+                    with _atomic_output(output_file, binary=True) as out:
+                        _write_lines(out, lines)
+                except OSError as e:
+                    raise DopyFileError(output_file, "write", e)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        return True
+
+
+# Dopy holds no state, so this one engine serves every caller
+_engine = Dopy()
+
+
+def transpile(code: str, line_map: Optional[array] = None) -> str:
+    """
+    Transpile dopy source to Python, the same as Dopy().preprocess. Safe to
+    call from any number of threads and asyncio tasks at once.
+    """
+    return _engine.preprocess(code, line_map)
@@ -0,0 +1,245 @@
+"""
+Warm transpiler daemon.
+
+Every dopy invocation pays for interpreter startup and its imports before
+doing any work. `dopy daemon` pays for them once: it keeps a process with
+the transpiler and formatter loaded listening on a Unix domain socket,
+and --check and --stdout hand their file to it when it is running.
+
+The protocol is one JSON object per line in each direction, so editor
+integrations can also talk to the socket directly:
+
+    {"version": "0.1.0", "mode": "check", "path": "/abs/module.dopy"}
+    {"version": "0.1.0", "mode": "stdout", "path": "/abs/module.dopy",
+     "pep8_strict": false}
+
+are answered with {"status": 0, "output": "..."}, the exit status and text
+the CLI would have printed. Requests the daemon can't serve, for example
+from another dopy version, get {"error": "..."} and the CLI falls back to
+doing the work itself.
+"""
+
+import os
+import stat
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from dopy import __version__
+
+MODES = ("check", "stdout")
+
+# Seconds the client waits for an answer before doing the work itself
+CLIENT_TIMEOUT = 30.0
+
+
+def default_socket_path() -> Path:
+    """$DOPY_SOCKET, else dopy.sock in $XDG_RUNTIME_DIR or the cache dir"""
+    override = os.environ.get("DOPY_SOCKET")
+    if override:
+        return Path(override)
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / "dopy.sock"
+    # dopy.cache.default_cache_dir, without importing the cache on every
+    # --check
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "dopy" / "daemon.sock"
+
+
+def forward(
+    mode: str,
+    path: Union[str, Path],
+    pep8_strict: bool = False,
+    socket_path: Union[str, Path, None] = None,
+) -> Optional[Tuple[int, str]]:
+    """
+    Have a running daemon carry out mode for path. Returns the exit status
+    and output, or None if no daemon is running or it couldn't answer.
+    """
+    if socket_path is None:
+        socket_path = default_socket_path()
+    # Without a daemon, don't even pay for importing socket
+    if not os.path.exists(socket_path):
+        return None
+
+    import json
+    import socket
+
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    request = {
+        "version": __version__,
+        "mode": mode,
+        "path": str(path),
+        "pep8_strict": pep8_strict,
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(CLIENT_TIMEOUT)
+            client.connect(str(socket_path))
+            client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with client.makefile("rb") as reader:
+                line = reader.readline()
+    except OSError:
+        return None
+
+    try:
+        response = json.loads(line)
+        return int(response["status"]), str(response["output"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class DopyDaemon:
+    """
+    Serves --check and --stdout requests from a warm process.
+
+    Every connection is served on its own thread, so an editor keeping a
+    connection open doesn't hold up other clients. The transpiler keeps
+    no state, and the results, kept in memory keyed by the file's mtime
+    and size so asking again about an unchanged file doesn't even read
+    it, are guarded by a lock.
+    """
+
+    # Results remembered, least recently used are dropped first
+    MAX_RESULTS = 1024
+
+    def __init__(self, socket_path: Union[str, Path, None] = None):
+        if socket_path is None:
+            socket_path = default_socket_path()
+        self.socket_path = Path(socket_path)
+        self._results: "OrderedDict[tuple, Tuple[int, str]]" = OrderedDict()
+        self._results_lock = threading.Lock()
+        self._server = None
+
+    def handle(self, request: dict) -> dict:
+        """Answer a single decoded request"""
+        if request.get("version") != __version__:
+            return {"error": f"daemon runs dopy {__version__}"}
+        mode = request.get("mode")
+        if mode not in MODES:
+            return {"error": f"unknown mode {mode!r}"}
+        path = Path(str(request.get("path", "")))
+        pep8_strict = bool(request.get("pep8_strict", False))
+
+        try:
+            info = os.stat(path)
+        except OSError as e:
+            return {"status": 1, "output": f"Error: {e}"}
+        key = (mode, str(path), pep8_strict, info.st_mtime_ns, info.st_size)
+        with self._results_lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+        if result is None:
+            from dopy.cli import check_file, format_file
+
+            try:
+                if mode == "check":
+                    result = check_file(path)
+                else:
+                    result = format_file(path, pep8_strict)
+            except Exception as e:
+                return {
+                    "status": 1,
+                    "output": f"Error: An unexpected error occurred: {e}",
+                }
+            with self._results_lock:
+                self._results[key] = result
+                while len(self._results) > self.MAX_RESULTS:
+                    self._results.popitem(last=False)
+
+        status, output = result
+        return {"status": status, "output": output}
+
+    def _serve_connection(self, connection, client_address, server) -> None:
+        """socketserver request handler, one JSON request per line"""
+        import json
+
+        with connection.makefile("rb") as reader:
+            for line in reader:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if isinstance(request, dict):
+                    response = self.handle(request)
+                else:
+                    response = {"error": "malformed request"}
+                connection.sendall(json.dumps(response).encode("utf-8") + b"\n")
+
+    def _remove_stale_socket(self) -> None:
+        """Remove a socket left behind by a daemon that is no longer running"""
+        import socket
+
+        try:
+            mode = os.stat(self.socket_path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise OSError(f"{self.socket_path} exists and is not a socket")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(self.socket_path))
+            except OSError:
+                self.socket_path.unlink()
+                return
+        raise OSError(f"A dopy daemon is already listening on {self.socket_path}")
+
+    def bind(self) -> None:
+        """Start listening on the socket, readable by this user only"""
+        import socketserver
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self._remove_stale_socket()
+        umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(
+                str(self.socket_path), self._serve_connection
+            )
+            # Idle editor connections mustn't keep the daemon from exiting
+            self._server.daemon_threads = True
+        finally:
+            os.umask(umask)
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """Stop serve_forever, from another thread"""
+        self._server.shutdown()
+
+    def close(self) -> None:
+        """Stop listening and remove the socket"""
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+        try:
+            self.socket_path.unlink()
+        except OSError:
+            pass
+
+    def run(self) -> int:
+        """Serve until interrupted or terminated"""
+        import signal
+
+        try:
+            self.bind()
+        except OSError as e:
+            print(f"Error: {e}")
+            return 1
+        # What the daemon is for, loaded before the first request arrives
+        import dopy.cli
+        import dopy.pep8
+
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        print(f"dopy daemon listening on {self.socket_path}")
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+        return 0
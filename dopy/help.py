@@ -3,14 +3,38 @@ dopy: Python without indentation
 
 USAGE
 dopy <my_module>.dopy
+dopy --check|--keep <files, dirs or globs>...
+dopy --stdout --output-dir DIR <files, dirs or globs>...
+dopy daemon
 
 FLAGS
 -h, --help: Print this text
 -k, --keep: Keep the transpiled files
+-w, --watch: Keep the transpiled files and rebuild them whenever a module changes
 -s, --stdout: Print the transpiled python to console and exit
--c, --check: Check dopy syntax without transpiling
+-c, --check: Check dopy syntax without transpiling, reporting every error
+--json: With --check, print the errors of all targets as one JSON report
+-o, --output-dir DIR: With --stdout, write the formatted modules under DIR
+--pep8-strict: Format --stdout output with autopep8 (pip install 'dopy-syntax[pep8]')
+-j, --jobs N: Transpile with up to N parallel workers
+--no-daemon: Don't hand --check and --stdout to a running dopy daemon
+--no-cache: Transpile every module from scratch, ignoring the cache
+--profile: Print wall time, CPU time, files and bytes for each phase
+--profile-json FILE: Write the same per-phase breakdown to FILE as JSON
 
 EXAMPLE:
 dopy -k my_module.dopy
 Run my_module.dopy and keep the transpiled files
+
+dopy -c src/ 'scripts/**/*.dopy'
+Check every module under src/ and scripts/ in one go, exit 1 on any error
+
+DAEMON
+`dopy daemon` keeps a warm process listening on $XDG_RUNTIME_DIR/dopy.sock
+(or $DOPY_SOCKET); --check and --stdout are answered by it while it runs
+
+CACHE
+Transpiled modules, their bytecode and the import graph are cached in
+$XDG_CACHE_HOME/dopy (~/.cache/dopy by default) and reused while their
+source is unchanged
 """
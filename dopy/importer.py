@@ -0,0 +1,173 @@
+import importlib.abc
+import importlib.util
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from dopy import profiling, sourcemap
+from dopy.cache import TranspileCache
+from dopy.core import Dopy, transpile
+from dopy.exceptions import DopyError, DopyFileError
+
+
+class DopyLoader(importlib.abc.Loader):
+    """Loads a .dopy module by transpiling it in memory and executing the result"""
+
+    def __init__(
+        self, fullname: str, path: str, cache: Optional[TranspileCache] = None
+    ):
+        self.name = fullname
+        self.path = path
+        self.cache = cache
+
+    def create_module(self, spec):
+        # Default module creation
+        return None
+
+    def get_filename(self, fullname: str) -> str:
+        return self.path
+
+    def is_package(self, fullname: str) -> bool:
+        return os.path.basename(self.path) == "__init__.dopy"
+
+    def get_source_bytes(self) -> bytes:
+        """Return the raw .dopy source"""
+        with profiling.phase("read", files=1) as call:
+            try:
+                with open(self.path, "rb") as f:
+                    source = f.read()
+            except OSError as e:
+                raise DopyFileError(self.path, "read", e)
+            call.bytes = len(source)
+        return source
+
+    def transpile(self, source: bytes, line_map: Optional[array] = None) -> str:
+        """
+        Return the transpiled Python source, served from the cache if
+        possible. The source line of every output line is appended to
+        line_map when given.
+        """
+        if self.cache is not None:
+            with profiling.phase("cache"):
+                processed = self.cache.get(source)
+            if processed is not None:
+                if line_map is not None:
+                    line_map.extend(Dopy().line_table(source.decode("utf-8")))
+                return processed
+
+        with profiling.phase("transpile", files=1, nbytes=len(source)):
+            processed = transpile(source.decode("utf-8"), line_map)
+        if self.cache is not None:
+            with profiling.phase("cache"):
+                self.cache.put(source, processed)
+        return processed
+
+    def _syntax_error(self, source: bytes, error: DopyError) -> SyntaxError:
+        """error as a SyntaxError at its .dopy line, like those of compile"""
+        text = source.decode("utf-8")
+        diagnostics = Dopy().collect_errors(text)
+        if diagnostics:
+            first = diagnostics[0]
+            lineno, offset, message = first.line, first.column, first.message
+        else:
+            lineno, offset, message = error.line_number, None, error.message
+        line = text.split("\n")[lineno - 1] if lineno else None
+        # Its line is already that of the .dopy file, a table left by an
+        # earlier version of the module mustn't remap it
+        sourcemap.unregister(self.path)
+        return SyntaxError(message, (self.path, lineno, offset, line))
+
+    def get_code(self, fullname: str):
+        source = self.get_source_bytes()
+        if self.cache is not None:
+            with profiling.phase("cache"):
+                cached = self.cache.get_code_and_lines(self.path, source)
+            if cached is not None:
+                code, line_map = cached
+                sourcemap.register(self.path, line_map)
+                return code
+
+        line_map = array("I")
+        try:
+            processed = self.transpile(source, line_map)
+        except DopyError as e:
+            raise self._syntax_error(source, e) from None
+        # Registered first so syntax errors from compile are mapped too
+        sourcemap.register(self.path, line_map)
+        with profiling.phase("compile", files=1):
+            code = compile(processed, self.path, "exec", dont_inherit=True)
+        if self.cache is not None:
+            with profiling.phase("cache"):
+                self.cache.put_code(self.path, source, code, line_map)
+        return code
+
+    def exec_module(self, module) -> None:
+        code = self.get_code(module.__name__)
+        if module.__name__ == "__main__":
+            # The entry point is timed as a whole by run_module
+            exec(code, module.__dict__)
+            return
+        with profiling.phase("import", files=1):
+            exec(code, module.__dict__)
+
+
+class DopyFinder(importlib.abc.MetaPathFinder):
+    """
+    Meta path finder for .dopy modules.
+
+    Top level modules are looked up in the given roots, submodules in the
+    __path__ of their parent package, so .dopy modules can live inside
+    regular Python packages and vice versa. A package is a directory with
+    an __init__.dopy.
+    """
+
+    def __init__(
+        self,
+        roots: Iterable[Union[str, Path]],
+        cache: Optional[TranspileCache] = None,
+    ):
+        self.roots = [str(root) for root in roots]
+        self.cache = cache
+
+    def find_spec(self, fullname, path, target=None):
+        name = fullname.rpartition(".")[2]
+        for entry in self.roots if path is None else path:
+            base = os.path.join(entry, name)
+
+            init_path = os.path.join(base, "__init__.dopy")
+            if os.path.isfile(init_path):
+                return importlib.util.spec_from_file_location(
+                    fullname,
+                    init_path,
+                    loader=DopyLoader(fullname, init_path, self.cache),
+                    submodule_search_locations=[base],
+                )
+
+            module_path = base + ".dopy"
+            if os.path.isfile(module_path):
+                return importlib.util.spec_from_file_location(
+                    fullname,
+                    module_path,
+                    loader=DopyLoader(fullname, module_path, self.cache),
+                )
+
+        return None
+
+
+def install(
+    roots: Iterable[Union[str, Path]], cache: Optional[TranspileCache] = None
+) -> DopyFinder:
+    """Put a DopyFinder for roots at the front of sys.meta_path and return it"""
+    finder = DopyFinder(roots, cache)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def uninstall(finder: DopyFinder) -> None:
+    """Remove a finder added by install"""
+    try:
+        sys.meta_path.remove(finder)
+    except ValueError:
+        pass
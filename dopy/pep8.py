@@ -0,0 +1,764 @@
+"""
+PEP 8 layout for transpiled code.
+
+The engine already decides the block structure of its output, so instead
+of handing the result to autopep8 this module re-emits the token stream
+with canonical indentation, whitespace and blank lines. The rules are the
+pycodestyle checks autopep8 fixes by default: indentation and continuation
+lines (E1), whitespace (E2), blank lines (E3) and trailing whitespace and
+blank lines (W2, W3). Long lines and compound statements are left as they
+are, autopep8 itself remains available for those.
+"""
+
+import io
+import keyword
+import re
+import tokenize
+from typing import List, Optional, Set
+
+INDENT_SIZE = 4
+# Blank lines around top level definitions and around methods
+TOP_LEVEL_LINES = 2
+METHOD_LINES = 1
+
+# Operators that always take a space on both sides
+_WS_NEEDED = frozenset(
+    ["**=", "*=", "/=", "//=", "+=", "-=", "!=", "<", ">", "%=", "^=", "&="]
+    + ["|=", "==", "<=", ">=", "<<=", ">>=", "=", "and", "in", "is", "or"]
+    + ["->", ":="]
+)
+# Operators that take spaces on neither or both sides
+_WS_OPTIONAL = frozenset(["**", "*", "/", "//", "+", "-", "@"]) | frozenset(
+    ["^", "&", "|", "<<", ">>", "%"]
+)
+# Optional operators that are spaced even when they have no spaces at all
+_WS_EXPECTED = frozenset(["^", "&", "|", "<<", ">>", "%"])
+_UNARY = frozenset([">>", "**", "*", "+", "-"])
+_SINGLETONS = frozenset(["False", "None", "True"])
+_KEYWORDS = frozenset(keyword.kwlist + ["print"]) - _SINGLETONS
+
+_OPERATOR = re.compile(r"(?:[-+*/|!<=>%&^]+|:=)$")
+_STARTSWITH_DEF = re.compile(r"(async\s+def|def)\b")
+_STARTSWITH_TOP_LEVEL = re.compile(r"(async\s+def\s+|def\s+|class\s+|@)")
+_DOCSTRING = re.compile(r'u?r?["\']')
+_DEFS = ("def ", "async def ")
+
+_OPENING = frozenset("([{")
+_CLOSING = frozenset(")]}")
+_NEWLINES = (tokenize.NEWLINE, tokenize.NL)
+_SKIPPED = (tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER)
+
+
+class _Line:
+    """A logical line of output: a statement, a comment or a blank line"""
+
+    __slots__ = ("kind", "text", "indent", "rows", "opens_block", "respaced")
+
+    def __init__(self, kind: str, text: str = "", indent: int = 0, rows=()):
+        self.kind = kind
+        self.text = text
+        self.indent = indent
+        self.rows = list(rows)
+        self.opens_block = False
+        # Whether the whitespace of the first row was fixed
+        self.respaced = False
+
+
+def _expand_indent(line: str) -> int:
+    """Width of the leading whitespace of line, with tabs to multiples of 8"""
+    width = 0
+    for char in line:
+        if char == "\t":
+            width = width // 8 * 8 + 8
+        elif char == " ":
+            width += 1
+        else:
+            break
+    return width
+
+
+def _fix_comment(text: str, inline: bool) -> Optional[str]:
+    """
+    Give a comment its '# ' prefix. Returns None for an inline comment
+    with nothing in it, which is dropped.
+    """
+    symbol, _, comment = text.partition(" ")
+    bad_prefix = symbol not in "#:" and (symbol.lstrip("#")[:1] or "#")
+    if inline:
+        if bad_prefix or comment[:1] in " \t":
+            comment = text.lstrip(" \t#")
+            return "# " + comment if comment.strip() else None
+        return text
+    if not bad_prefix:
+        return text
+    if bad_prefix != "#":
+        body = text.lstrip("#")
+        hashes = text[: len(text) - len(body)]
+        body = body.lstrip(" \t")
+        if body.startswith("!"):
+            return text
+        return hashes + " " + body if body.strip() else hashes
+    if comment and not text.endswith("#"):
+        return "# " + text.lstrip("# \t")
+    return text
+
+
+class _Statement:
+    """
+    Lays out the tokens of one logical line. The whitespace rules look at
+    the code tokens only, the way pycodestyle does, so comments and line
+    breaks are skipped when deciding what an operator sits next to.
+    """
+
+    def __init__(self, tokens: List[tokenize.TokenInfo], rows: List[str]):
+        self.tokens = tokens
+        self.rows = rows
+        count = len(tokens)
+        # Previous code token of each token
+        self.code_prev: List[Optional[int]] = [None] * count
+        # Bracket and lambda nesting after each token, as pycodestyle tracks it
+        self.braces: List[tuple] = [()] * count
+        self.operator: List[Optional[str]] = [None] * count
+        # "bare" for keyword argument "=", "spaced" for an annotated default
+        self.equals: List[Optional[str]] = [None] * count
+        self._analyse()
+
+    def _analyse(self) -> None:
+        braces = []
+        parens = []
+        first_row = self.rows[self.tokens[0].start[0] - 1]
+        in_def = bool(_STARTSWITH_DEF.match(first_row.lstrip()))
+        annotated = False
+        prev = None
+        for index, token in enumerate(self.tokens):
+            kind, text = token.type, token.string
+            if kind == tokenize.OP and text in _OPENING:
+                braces.append(text)
+            elif kind == tokenize.NAME and text == "lambda":
+                braces.append("l")
+            elif braces:
+                if kind == tokenize.OP and text in _CLOSING:
+                    braces.pop()
+                elif braces[-1] == "l" and kind == tokenize.OP and text == ":":
+                    braces.pop()
+            self.braces[index] = tuple(braces)
+
+            if kind in _NEWLINES or kind == tokenize.COMMENT:
+                continue
+            self.code_prev[index] = prev
+            if prev is not None:
+                self.operator[index] = self._operator_kind(index, prev, braces)
+
+            if kind == tokenize.OP:
+                if text in "([":
+                    parens.append(text)
+                elif text in ")]" and parens:
+                    parens.pop()
+                elif text == ":" and in_def and parens == ["("]:
+                    annotated = True
+                elif len(parens) == 1 and text == ",":
+                    annotated = False
+                elif parens and text == "=":
+                    spaced = annotated and parens == ["("]
+                    self.equals[index] = "spaced" if spaced else "bare"
+                if not parens:
+                    annotated = False
+            prev = index
+
+    def _operator_kind(self, index: int, prev: int, braces: list) -> Optional[str]:
+        """
+        "needed" for an operator that takes a space on both sides,
+        "optional" for one that takes spaces on neither or both sides.
+        """
+        token = self.tokens[index]
+        if token.type not in (tokenize.OP, tokenize.NAME):
+            return None
+        text = token.string
+        if text == "=" and braces[-1:] in (["l"], ["("]):
+            return None
+        if text in _WS_NEEDED:
+            return "needed"
+        if text in _UNARY:
+            before = self.tokens[prev]
+            if (before.type == tokenize.OP and before.string in _CLOSING) or (
+                before.type != tokenize.OP
+                and before.string not in _KEYWORDS
+                and not keyword.issoftkeyword(before.string)
+            ):
+                return "optional"
+            return None
+        if text in _WS_OPTIONAL:
+            return "optional"
+        return None
+
+    def _source_gap(self, before: Optional[int], after: int) -> Optional[str]:
+        """Whitespace between two tokens in the source, None across rows"""
+        if before is None:
+            return None
+        start, end = self.tokens[before].end, self.tokens[after].start
+        if start[0] != end[0]:
+            return None
+        return self.rows[end[0] - 1][start[1] : end[1]]
+
+    def _next_code(self, index: int) -> Optional[int]:
+        for after in range(index + 1, len(self.tokens)):
+            if self.code_prev[after] == index:
+                return after
+        return None
+
+    def gap(self, before: int, index: int) -> str:
+        """Whitespace to put between two tokens on the same row"""
+        token, prev = self.tokens[index], self.tokens[before]
+        kind, text = token.type, token.string
+        prev_kind, prev_text = prev.type, prev.string
+        gap = self.rows[token.start[0] - 1][prev.end[1] : token.start[1]]
+
+        if kind in _NEWLINES:
+            return ""
+        if kind == tokenize.COMMENT:
+            return gap
+        if prev_kind == tokenize.OP and prev_text in _OPENING:
+            return ""
+        if kind == tokenize.OP and (text in _CLOSING or text in ",;:"):
+            row = self.rows[token.end[0] - 1]
+            following = row[token.end[1] : token.end[1] + 1]
+            # pycodestyle only lets a single space after a comma through
+            after_comma = prev_text == "," and len(gap) == 1
+            if not after_comma and not (text == ":" and following == "="):
+                return ""
+        if (
+            kind == tokenize.OP
+            and text in "(["
+            and (
+                prev_kind == tokenize.NAME
+                or (prev_kind == tokenize.OP and prev_text in _CLOSING)
+            )
+            and not (before > 0 and self.tokens[before - 1].string == "class")
+            and not keyword.iskeyword(prev_text)
+            and (prev_text == "type" or not keyword.issoftkeyword(prev_text))
+        ):
+            return ""
+        if self.equals[index] == "bare" or self.equals[before] == "bare":
+            return ""
+
+        if not gap and self._needs_space(before, index):
+            return " "
+
+        if "\t" in gap or len(gap) > 1:
+            if (prev_kind == tokenize.NAME and prev_text in _KEYWORDS) or (
+                kind == tokenize.NAME and text in _KEYWORDS
+            ):
+                return " "
+            if _OPERATOR.match(text) and kind == tokenize.OP:
+                if not prev_text.endswith(","):
+                    return " "
+            if _OPERATOR.match(prev_text) and prev_kind == tokenize.OP:
+                first = self.code_prev[before]
+                if first is not None and not self.tokens[first].string.endswith(","):
+                    return " "
+        return gap
+
+    def _needs_space(self, before: int, index: int) -> bool:
+        """Whether two touching tokens must be separated by a space"""
+        token, prev = self.tokens[index], self.tokens[before]
+        kind, text = token.type, token.string
+        prev_kind, prev_text = prev.type, prev.string
+
+        if prev_kind == tokenize.OP and prev_text in ",;:":
+            if prev_text == ":" and self.braces[before][-1:] == ("[",):
+                pass
+            elif prev_text == "," and text in ")]":
+                pass
+            else:
+                return True
+        if "spaced" in (self.equals[index], self.equals[before]):
+            return True
+        if (
+            prev_kind == tokenize.NAME
+            and keyword.iskeyword(prev_text)
+            and prev_text not in _SINGLETONS
+            and not (prev_text == "except" and text == "*")
+            and not (prev_text == "yield" and text == ")")
+            and text not in (":", "")
+        ):
+            return True
+        if kind == tokenize.COMMENT:
+            return False
+
+        if self.code_prev[index] != before:
+            return False
+        operator = self.operator[before]
+        if operator == "needed":
+            if not (prev_text == "/" and text in {",", ")", ":"}) and not (
+                prev_text == ")" and text == ":"
+            ):
+                return True
+        elif operator == "optional":
+            leading = self._source_gap(self.code_prev[before], before)
+            if leading is None or leading or prev_text in _WS_EXPECTED:
+                return True
+        operator = self.operator[index]
+        if operator == "needed":
+            return True
+        if operator == "optional":
+            following = self._next_code(index)
+            trailing = None if following is None else self._source_gap(index, following)
+            if trailing is None or trailing or text in _WS_EXPECTED:
+                return True
+        return False
+
+    def layout(self, indent: int) -> List[str]:
+        """
+        The statement's rows, the first one indented by indent. Continuation
+        rows move along with the first one, see _fix_continuation.
+        """
+        first = self.tokens[0]
+        shift = indent - _expand_indent(self.rows[first.start[0] - 1])
+        out = [" " * indent]
+        prev = None
+        depth = 0
+
+        for index, token in enumerate(self.tokens):
+            kind, text = token.type, token.string
+
+            if prev is not None and token.start[0] != self.tokens[prev].end[0]:
+                before = self.tokens[prev]
+                if before.type not in _NEWLINES:
+                    # Backslash continuation, the rest of the row is kept
+                    # unless brackets already carry on the line (E502)
+                    row = self.rows[before.end[0] - 1]
+                    tail = row[before.end[1] :].rstrip()
+                    if depth and kind != tokenize.COMMENT:
+                        tail = tail.rstrip(" \t\\")
+                    out.append(tail + "\n")
+                if kind not in _NEWLINES:
+                    width = _expand_indent(self.rows[token.start[0] - 1])
+                    out.append(" " * max(width + shift, 0))
+                if kind == tokenize.COMMENT:
+                    text = _fix_comment(text, inline=False)
+            elif prev is not None:
+                gap = self.gap(prev, index)
+                if kind == tokenize.COMMENT:
+                    fixed = _fix_comment(text, inline=True)
+                    if fixed != text or len(gap) < 2:
+                        gap = "  " if fixed is not None else ""
+                        text = fixed or ""
+                out.append(gap)
+            elif kind == tokenize.COMMENT:
+                text = _fix_comment(text, inline=False)
+
+            out.append("\n" if kind in _NEWLINES else text)
+            prev = index
+            if kind == tokenize.OP and text in _OPENING:
+                depth += 1
+            elif kind == tokenize.OP and text in _CLOSING:
+                depth -= 1
+
+        rows = "".join(out).split("\n")
+        if len(rows) > 1 and rows[-1] == "":
+            rows.pop()
+        # Trailing whitespace inside a multiline string is part of its value,
+        # though autopep8 still empties whitespace-only rows (W293)
+        literal = {
+            row - first.start[0]
+            for token in self.tokens
+            if token.type not in _NEWLINES
+            for row in range(token.start[0], token.end[0])
+        }
+        return [
+            row if index in literal and row.strip() else row.rstrip()
+            for index, row in enumerate(rows)
+        ]
+
+
+def _continuation_errors(rows: List[str], opens_block: bool, indented: bool):
+    """
+    Find continuation rows that pycodestyle's E12 checks reject, yielding
+    (row, code, indentation wanted) as autopep8 reports them. indented
+    tells whether the statement starts a new block.
+    """
+    readline = io.StringIO("\n".join(rows) + "\n").readline
+    tokens = [
+        token
+        for token in tokenize.generate_tokens(readline)
+        if token.type not in (tokenize.DEDENT, tokenize.ENDMARKER)
+        and (indented or token.type != tokenize.INDENT)
+    ]
+    indent_level = _expand_indent(rows[0])
+    first_row = tokens[0].start[0]
+    nrows = 1 + tokens[-1].start[0] - first_row
+
+    row = depth = 0
+    parens = [0] * nrows
+    rel_indent = [0] * nrows
+    open_rows = [[0]]
+    hangs = [None]
+    indent_chances = {}
+    last_indent = tokens[0].start
+    indent = [last_indent[1]]
+    last_token_multiline = False
+    last_line = ""
+    last_line_begins_with_multiline = False
+    visual_indent = None
+    start = line = None
+
+    for kind, text, start, end, line in tokens:
+        newline = row < start[0] - first_row
+        if newline:
+            row = start[0] - first_row
+            newline = not last_token_multiline and kind not in _NEWLINES
+            last_line_begins_with_multiline = last_token_multiline
+
+        if newline:
+            last_indent = start
+            rel_indent[row] = _expand_indent(line) - indent_level
+            close_bracket = kind == tokenize.OP and text in _CLOSING
+
+            for open_row in reversed(open_rows[depth]):
+                hang = rel_indent[row] - rel_indent[open_row]
+                hanging_indent = hang == INDENT_SIZE
+                if hanging_indent:
+                    break
+            if hangs[depth]:
+                hanging_indent = hang == hangs[depth]
+            visual_indent = (
+                not close_bracket and hang > 0 and indent_chances.get(start[1])
+            )
+
+            one_indented = indent_level + rel_indent[open_row] + INDENT_SIZE
+            if close_bracket and indent[depth]:
+                if start[1] != indent[depth]:
+                    yield start[0], "E124", indent[depth]
+            elif close_bracket and not hang:
+                pass
+            elif indent[depth] and start[1] < indent[depth]:
+                if visual_indent is not True:
+                    yield start[0], "E128", indent[depth]
+            elif hanging_indent or (opens_block and rel_indent[row] == 2 * INDENT_SIZE):
+                if close_bracket:
+                    yield start[0], "E123", indent_level + rel_indent[open_row]
+                hangs[depth] = hang
+            elif visual_indent is True:
+                indent[depth] = start[1]
+            elif visual_indent in (text, str):
+                pass
+            elif hang <= 0:
+                yield start[0], "E122", one_indented
+            elif indent[depth]:
+                yield start[0], "E127", indent[depth]
+            elif not close_bracket and hangs[depth]:
+                yield start[0], "E131", one_indented
+            else:
+                if hang <= INDENT_SIZE:
+                    hangs[depth] = hang
+                yield start[0], "E126" if hang > INDENT_SIZE else "E121", one_indented
+
+        # Columns later rows may line up with
+        if (
+            parens[row]
+            and kind not in (tokenize.NL, tokenize.COMMENT)
+            and not (indent[depth])
+        ):
+            indent[depth] = start[1]
+            indent_chances[start[1]] = True
+        elif kind in (tokenize.STRING, tokenize.COMMENT) or text in (
+            "u",
+            "ur",
+            "b",
+            "br",
+        ):
+            indent_chances[start[1]] = str
+        elif not indent_chances and not row and not depth and text == "if":
+            # "if (" is as long as an indent
+            indent_chances[end[1] + 1] = True
+        elif text == ":" and line[end[1] :].isspace():
+            open_rows[depth].append(row)
+
+        if kind == tokenize.OP:
+            if text in _OPENING:
+                depth += 1
+                indent.append(0)
+                hangs.append(None)
+                if len(open_rows) == depth:
+                    open_rows.append([])
+                open_rows[depth].append(row)
+                parens[row] += 1
+            elif text in _CLOSING and depth > 0:
+                # Parent indents should not be more than this one
+                prev_indent = indent.pop() or last_indent[1]
+                hangs.pop()
+                for d in range(depth):
+                    if indent[d] > prev_indent:
+                        indent[d] = 0
+                for column in list(indent_chances):
+                    if column >= prev_indent:
+                        del indent_chances[column]
+                del open_rows[depth + 1 :]
+                depth -= 1
+                if depth:
+                    indent_chances[indent[depth]] = True
+                for idx in range(row, -1, -1):
+                    if parens[idx]:
+                        parens[idx] -= 1
+                        break
+            if start[1] not in indent_chances and not last_line.rstrip().endswith(","):
+                # Tokens may be lined up with this one
+                indent_chances[start[1]] = text
+
+        last_token_multiline = start[0] != end[0]
+        if last_token_multiline:
+            rel_indent[end[0] - first_row] = rel_indent[row]
+        last_line = line
+
+    if (
+        opens_block
+        and not last_line_begins_with_multiline
+        and _expand_indent(line) == indent_level + INDENT_SIZE
+    ):
+        code = "E129" if visual_indent else "E125"
+        yield start[0], code, indent_level + 2 * INDENT_SIZE
+
+
+def _fix_continuation(
+    rows: List[str], opens_block: bool, indented: bool, busy: Set[int]
+) -> List[str]:
+    """
+    Re-indent continuation rows until the E12 checks pass, fixing each
+    row at most once per round like autopep8 does. Rows in busy already
+    had a fix in the first round.
+    """
+    seen = set()
+    while tuple(rows) not in seen:
+        if not busy:
+            seen.add(tuple(rows))
+        original = list(rows)
+        errors = _continuation_errors(rows, opens_block, indented)
+        for row, code, wanted in sorted(errors, key=lambda error: error[0]):
+            index = row - 1
+            if rows[index] != original[index] or index in busy:
+                continue
+            current = _expand_indent(rows[index])
+            if code == "E125":
+                # Everything above at this indentation moves along
+                while index >= 0 and _expand_indent(rows[index]) >= current:
+                    rows[index] = " " * (wanted - current) + rows[index]
+                    index -= 1
+            elif code == "E131":
+                add = 4 if wanted == current == 0 else wanted - current
+                rows[index] = (
+                    " " * add + rows[index] if add >= 0 else rows[index][-add:]
+                )
+            else:
+                rows[index] = " " * wanted + rows[index].lstrip()
+        busy = set()
+    return rows
+
+
+class _Formatter:
+    """Splits a source into logical lines and lays each one out"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.rows = source.split("\n")
+        self.lines: List[_Line] = []
+        # Source widths of the enclosing blocks
+        self.blocks = [0]
+        self.prev_code: Optional[_Line] = None
+
+    def run(self) -> List[_Line]:
+        group = []
+        depth = 0
+        readline = io.StringIO(self.source).readline
+        for token in tokenize.generate_tokens(readline):
+            if token.type in _SKIPPED:
+                continue
+            group.append(token)
+            if token.type == tokenize.OP:
+                if token.string in _OPENING:
+                    depth += 1
+                elif token.string in _CLOSING:
+                    depth = max(depth - 1, 0)
+            elif token.type == tokenize.NEWLINE or (
+                token.type == tokenize.NL and not depth
+            ):
+                self._add_group(group)
+                group = []
+        if group:
+            self._add_group(group)
+        return self.lines
+
+    def _add_group(self, tokens: List[tokenize.TokenInfo]) -> None:
+        first = tokens[0]
+        if first.type in _NEWLINES:
+            self.lines.append(_Line("blank", rows=[""]))
+        elif first.type == tokenize.COMMENT and (
+            # The last line may lack its newline
+            len(tokens) == 1
+            or tokens[1].type in _NEWLINES
+        ):
+            self._add_comment(first)
+        else:
+            self._add_statement(tokens)
+
+    def _add_comment(self, token: tokenize.TokenInfo) -> None:
+        width = token.start[1]
+        prev_indent = self.prev_code.indent if self.prev_code else 0
+        indent = width
+        if self.prev_code is not None and self.prev_code.opens_block:
+            # E117: over-indented (E115, under-indented, is left alone)
+            indent = min(width, prev_indent + INDENT_SIZE)
+        elif width > prev_indent:
+            # E116: no block was opened, so no extra indent
+            indent = prev_indent
+        text = _fix_comment(token.string, inline=False)
+        self.lines.append(_Line("comment", text, indent, [" " * indent + text]))
+
+    def _add_statement(self, tokens: List[tokenize.TokenInfo]) -> None:
+        width = _expand_indent(self.rows[tokens[0].start[0] - 1])
+        opens_block = self.prev_code is not None and self.prev_code.opens_block
+        if width > self.blocks[-1]:
+            # An indent that doesn't follow a ":" stays at the current level
+            if opens_block:
+                self.blocks.append(width)
+        else:
+            while len(self.blocks) > 1 and self.blocks[-1] > width:
+                self.blocks.pop()
+        indent = INDENT_SIZE * (len(self.blocks) - 1)
+
+        rows = _Statement(tokens, self.rows).layout(indent)
+        line = _Line("code", rows[0].lstrip(), indent, rows)
+        code = [t for t in tokens if t.type not in _NEWLINES + (tokenize.COMMENT,)]
+        line.opens_block = bool(code) and code[-1].string == ":"
+        source = self.rows[tokens[0].start[0] - 1]
+        line.respaced = source.strip() != rows[0].strip()
+        if len(rows) > 1:
+            indented = self.prev_code is not None and indent > self.prev_code.indent
+            first = tokens[0].start[0] - 1
+            source = self.rows[first : first + len(rows)]
+            # Rows whose spacing was fixed wait a round for their indent
+            busy = {
+                index
+                for index, (before, after) in enumerate(zip(source, rows))
+                if before.strip() != after.strip()
+            }
+            line.rows = _fix_continuation(rows, line.opens_block, indented, busy)
+        self.lines.append(line)
+        self.prev_code = line
+
+
+def _blank_lines(lines: List[_Line]) -> List[_Line]:
+    """
+    Set the blank lines between statements: two around top level
+    definitions, one around nested ones and at most one or two elsewhere.
+    Comments directly above a definition stay attached to the code before.
+    """
+    out: List[_Line] = []
+    blank = _Line("blank", rows=[""])
+    prev_code: Optional[_Line] = None
+    prev_top_level = ""
+    # Longest run of blank lines since the previous statement, before and
+    # after E303 trimmed them
+    blank_before = trimmed_before = 0
+    run = 0
+
+    for line in lines:
+        if line.kind == "blank":
+            out.append(line)
+            run += 1
+            continue
+
+        blank_before = max(blank_before, run)
+        limit = TOP_LEVEL_LINES if not line.indent else METHOD_LINES
+        if prev_code is not None and prev_code.text.startswith("@"):
+            limit = 0
+        if run > limit:
+            del out[len(out) - (run - limit) :]
+            run = limit
+        trimmed_before = max(trimmed_before, run)
+
+        if line.kind == "comment":
+            out.append(line)
+            run = 0
+            continue
+
+        # autopep8 fixes E303 and the blank lines below in the same pass,
+        # unless the line is busy having its whitespace fixed
+        if line.respaced:
+            blank_before = trimmed_before
+
+        missing = 0
+        after_def = prev_code is not None and prev_code.text.startswith(_DEFS)
+        if after_def and run and _DOCSTRING.match(line.text):
+            # A docstring hugs the def it documents
+            del out[len(out) - run :]
+            run = 0
+        elif (
+            prev_code is not None
+            and _DOCSTRING.match(prev_code.text)
+            and line.indent
+            and not blank_before
+            and line.text.startswith(_DEFS)
+            and "(self" in line.text
+        ):
+            # One blank line between a class docstring and its first method
+            missing = METHOD_LINES
+        elif prev_code is None and blank_before < TOP_LEVEL_LINES:
+            pass
+        elif prev_code is not None and prev_code.text.startswith("@"):
+            pass
+        elif _STARTSWITH_TOP_LEVEL.match(line.text):
+            if _is_one_liner(line) and blank_before == 0:
+                pass
+            elif line.indent:
+                if not (
+                    blank_before == METHOD_LINES
+                    or (prev_code is not None and prev_code.indent < line.indent)
+                    or (prev_code is not None and _DOCSTRING.match(prev_code.text))
+                ):
+                    missing = METHOD_LINES - run
+            elif blank_before < TOP_LEVEL_LINES:
+                missing = TOP_LEVEL_LINES - run
+        elif (
+            not line.indent
+            and blank_before < TOP_LEVEL_LINES
+            and prev_top_level.startswith(("def ", "class "))
+        ):
+            # Goes above the comments right before the statement, if any
+            at = len(out)
+            while at and out[at - 1].kind == "comment":
+                at -= 1
+            gap = 0
+            while at - gap and out[at - gap - 1].kind == "blank":
+                gap += 1
+            out[at:at] = [blank] * (TOP_LEVEL_LINES - gap)
+        out.extend([blank] * max(missing, 0))
+        out.append(line)
+
+        prev_code = line
+        if not line.indent:
+            prev_top_level = line.text
+        blank_before = trimmed_before = run = 0
+
+    while out and out[-1].kind == "blank":
+        out.pop()
+    return out
+
+
+def _is_one_liner(line: _Line) -> bool:
+    """A def or class with its body on the same line"""
+    return len(line.rows) == 1 and not line.opens_block and ":" in line.text
+
+
+def format_code(source: str) -> str:
+    """
+    Lay out Python source according to PEP 8. Source that doesn't tokenize
+    only has trailing whitespace and trailing blank lines removed.
+    """
+    try:
+        lines = _blank_lines(_Formatter(source).run())
+        rows = [row for line in lines for row in line.rows]
+    except (SyntaxError, tokenize.TokenError):
+        rows = [row.rstrip() for row in source.split("\n")]
+        while rows and not rows[-1]:
+            rows.pop()
+    return "\n".join(rows) + "\n" if rows else ""
@@ -0,0 +1,144 @@
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+
+class PhaseStats:
+    """Accumulated cost of one named phase"""
+
+    __slots__ = ("calls", "wall", "cpu", "files", "bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.files = 0
+        self.bytes = 0
+
+    def to_dict(self) -> Dict[str, Union[int, float]]:
+        return {
+            "calls": self.calls,
+            "wall_ms": self.wall * 1000,
+            "cpu_ms": self.cpu * 1000,
+            "files": self.files,
+            "bytes": self.bytes,
+        }
+
+
+class PhaseCall:
+    """Counters for a single run of a phase, filled in by the caller"""
+
+    __slots__ = ("files", "bytes")
+
+    def __init__(self, files: int = 0, nbytes: int = 0):
+        self.files = files
+        self.bytes = nbytes
+
+
+class Profiler:
+    """
+    Records wall time, CPU time, file counts and bytes per phase.
+
+    CPU time is that of the thread running the phase, so phases run on
+    worker threads add up to the CPU spent across all of them. Phases may
+    nest, and the time of a nested phase is included in its parent too.
+    Work done in worker processes is not recorded.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, PhaseStats] = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    @contextmanager
+    def phase(self, name: str, files: int = 0, nbytes: int = 0):
+        call = PhaseCall(files, nbytes)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield call
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            with self._lock:
+                stats = self.phases.get(name)
+                if stats is None:
+                    stats = self.phases[name] = PhaseStats()
+                stats.calls += 1
+                stats.wall += wall
+                stats.cpu += cpu
+                stats.files += call.files
+                stats.bytes += call.bytes
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "total": {
+                "wall_ms": (time.perf_counter() - self._start) * 1000,
+                "cpu_ms": (time.process_time() - self._start_cpu) * 1000,
+            },
+            "phases": {name: stats.to_dict() for name, stats in self.phases.items()},
+        }
+
+    def report(self) -> str:
+        """Summary table of every phase, in the order they first ran"""
+        data = self.to_dict()
+        lines = [
+            f"{'phase':<12} {'calls':>6} {'files':>6} {'bytes':>10} "
+            f"{'wall ms':>10} {'cpu ms':>10}"
+        ]
+        for name, stats in data["phases"].items():
+            lines.append(
+                f"{name:<12} {stats['calls']:>6} {stats['files']:>6} "
+                f"{stats['bytes']:>10} {stats['wall_ms']:>10.2f} "
+                f"{stats['cpu_ms']:>10.2f}"
+            )
+        total = data["total"]
+        lines.append(
+            f"{'total':<12} {'':>6} {'':>6} {'':>10} "
+            f"{total['wall_ms']:>10.2f} {total['cpu_ms']:>10.2f}"
+        )
+        return "\n".join(lines)
+
+    def write_json(self, path: Union[str, Path]) -> None:
+        import json
+
+        Path(path).write_text(json.dumps(self.to_dict(), indent=2) + "\n")
+
+
+# Profiler recording the current run, None while profiling is off
+_active: Optional[Profiler] = None
+
+
+def enable() -> Profiler:
+    """Start recording phases into a fresh profiler and return it"""
+    global _active
+    _active = Profiler()
+    return _active
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+def enabled() -> bool:
+    return _active is not None
+
+
+@contextmanager
+def phase(name: str, files: int = 0, nbytes: int = 0):
+    """
+    Record the enclosed block as a phase of the active profiler, if any.
+
+    Yields a PhaseCall whose files and bytes counters can still be raised
+    once they are known, for example after reading a file.
+    """
+    profiler = _active
+    if profiler is None:
+        yield PhaseCall(files, nbytes)
+        return
+    with profiler.phase(name, files, nbytes) as call:
+        yield call
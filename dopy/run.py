@@ -1,13 +1,10 @@
 from pathlib import Path
-import tempfile
 import importlib.util
 import sys
-import shutil
-from typing import Union
+from typing import Optional, Union
 
-from dopy.transpiler import process_with_imports
-from dopy.transpiler.collector import DopyImportCollector
-from dopy.transpiler.processor import DopyProcessor
+from dopy import importer, profiling, sourcemap
+from dopy.cache import TranspileCache
 
 
 def setup_module_path(module_path: Union[str, Path]) -> tuple[str, Path]:
@@ -29,14 +26,21 @@ def setup_module_path(module_path: Union[str, Path]) -> tuple[str, Path]:
     return module_name, module_parent
 
 
-def run_module(module_path: str):
-    """Run a Python module dynamically from a file path."""
+def run_module(module_path: str, cache: Optional[TranspileCache] = None):
+    """
+    Run a Python or Dopy module dynamically from a file path. Tracebacks of
+    uncaught exceptions point at the .dopy source from then on.
+    """
+    sourcemap.install_excepthook()
     module_name, parent_path = setup_module_path(module_path)
 
     # Create and load the module spec with the full file path
     full_path = str(Path(module_path).resolve())
+    loader = None
+    if full_path.endswith(".dopy"):
+        loader = importer.DopyLoader("__main__", full_path, cache)
     spec = importlib.util.spec_from_file_location(
-        "__main__", full_path
+        "__main__", full_path, loader=loader
     )  # Changed module_name to "__main__"
     if spec is None:
         raise ImportError(f"Could not load module spec for {module_path}")
@@ -50,17 +54,28 @@ def run_module(module_path: str):
     if spec.loader is None:
         raise ImportError(f"Could not load module {module_path}")
 
-    spec.loader.exec_module(module)
+    with profiling.phase("run", files=1):
+        spec.loader.exec_module(module)
 
 
-def run_with_files(main_module: Union[str, Path], project_root: Path = None) -> None:
+def run_with_files(
+    main_module: Union[str, Path],
+    project_root: Path = None,
+    cache: Optional[TranspileCache] = None,
+    max_workers: Optional[int] = None,
+) -> None:
     """Run Dopy code while preserving the transpiled Python files."""
+    # Only this mode needs the transpiler pools
+    from dopy.transpiler import process_with_imports
+
     main_module = Path(main_module)
     if project_root is None:
         project_root = main_module.parent
 
     # Process all files
-    success = process_with_imports(str(main_module), project_root)
+    success = process_with_imports(
+        str(main_module), project_root, cache=cache, max_workers=max_workers
+    )
     if not success:
         raise ValueError(f"Failed to process {main_module} and its dependencies")
 
@@ -72,43 +87,22 @@ def run_with_files(main_module: Union[str, Path], project_root: Path = None) ->
         raise ValueError(f"Main module {main_module} was not successfully processed")
 
 
-def run_without_files(main_module: Union[str, Path], project_root: Path = None) -> None:
-    """Run Dopy code using a temporary directory."""
-    main_module = Path(main_module)
+def run_without_files(
+    main_module: Union[str, Path],
+    project_root: Path = None,
+    cache: Optional[TranspileCache] = None,
+) -> None:
+    """Run Dopy code, transpiling modules in memory as they are imported."""
+    main_module = Path(main_module).resolve()
     if project_root is None:
         project_root = main_module.parent
 
-    # Create temporary directory
-    temp_dir = None
-    try:
-        temp_dir = Path(tempfile.mkdtemp())
-
-        # Collect all dependencies
-        collector = DopyImportCollector(project_root)
-        all_files = collector.collect_all_imports(main_module)
-
-        # Copy files to temp directory preserving structure
-        temp_files = set()
-        for file_path in all_files:
-            rel_path = file_path.relative_to(project_root)
-            temp_path = temp_dir / rel_path
-            temp_path.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(file_path, temp_path)
-            temp_files.add(temp_path)
-
-        # Process all files
-        processor = DopyProcessor()
-        if not processor.process_all(temp_files):
-            raise ValueError("Failed to process one or more files")
-
-        # Run the processed module
-        temp_main = temp_dir / main_module.relative_to(project_root)
-        temp_main_py = temp_main.with_suffix(".py")
-        if temp_main_py.exists():
-            run_module(str(temp_main_py))
-        else:
-            raise ValueError(f"Main module {temp_main} was not successfully processed")
+    roots = [main_module.parent]
+    if Path(project_root).resolve() != main_module.parent:
+        roots.append(Path(project_root).resolve())
 
+    finder = importer.install(roots, cache)
+    try:
+        run_module(str(main_module), cache)
     finally:
-        if temp_dir and temp_dir.exists():
-            shutil.rmtree(temp_dir)
+        importer.uninstall(finder)
@@ -0,0 +1,125 @@
+"""
+Map tracebacks of transpiled modules back to their .dopy source.
+
+Transpiling drops blank lines, so line N of the Python that runs is not
+line N of the .dopy file its code is named after. When the loader
+transpiles a module, Dopy.preprocess also fills an array('I') with the
+source line of every output line, and the loader registers it here. The
+exception hook installed by run_module looks frames up in those tables,
+so rewriting a traceback never re-reads or re-transpiles a module.
+"""
+
+import linecache
+import os
+import sys
+import traceback
+from array import array
+from pathlib import Path
+from types import TracebackType
+from typing import Dict, List, Optional, Set, Union
+
+# FrameSummary takes end and column positions from Python 3.11 on
+_FRAME_POSITIONS = sys.version_info >= (3, 11)
+
+# Frames of the machinery loading .dopy modules, left out of their
+# tracebacks like CPython leaves out importlib's own
+_IMPORT_FRAMES = frozenset(
+    [
+        "<frozen importlib._bootstrap>",
+        "<frozen importlib._bootstrap_external>",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "importer.py"),
+    ]
+)
+
+# Line tables of loaded modules, keyed by the filename of their code
+_line_maps: Dict[str, array] = {}
+
+
+def register(path: Union[str, Path], line_map: array) -> None:
+    """Record the line table of the module compiled under path"""
+    _line_maps[os.fspath(path)] = line_map
+
+
+def unregister(path: Union[str, Path]) -> None:
+    """Forget the line table of the module compiled under path"""
+    _line_maps.pop(os.fspath(path), None)
+
+
+def source_line(path: str, lineno: Optional[int]) -> Optional[int]:
+    """The .dopy line of line lineno of the module compiled under path"""
+    line_map = _line_maps.get(path)
+    if line_map is None or lineno is None or not 0 < lineno <= len(line_map):
+        return lineno
+    return line_map[lineno - 1]
+
+
+def _remap(exc: traceback.TracebackException, seen: Set[int]) -> None:
+    """Rewrite the frames of exc and of every exception chained to it"""
+    if id(exc) in seen:
+        return
+    seen.add(id(exc))
+
+    if any(frame.filename in _line_maps for frame in exc.stack):
+        exc.stack = traceback.StackSummary.from_list(
+            [frame for frame in exc.stack if frame.filename not in _IMPORT_FRAMES]
+        )
+    for i, frame in enumerate(exc.stack):
+        if frame.filename not in _line_maps:
+            continue
+        lineno = source_line(frame.filename, frame.lineno)
+        # Columns are those of the transpiled line, so they are dropped
+        extra = {"end_lineno": lineno} if _FRAME_POSITIONS else {}
+        exc.stack[i] = traceback.FrameSummary(
+            frame.filename,
+            lineno,
+            frame.name,
+            lookup_line=False,
+            locals=frame.locals,
+            **extra,
+        )
+
+    # Only set for SyntaxError, pointing into the source being compiled
+    if getattr(exc, "filename", None) in _line_maps:
+        # TracebackException keeps it as a string
+        lineno = source_line(exc.filename, int(exc.lineno))
+        exc.lineno = exc.end_lineno = str(lineno)
+        exc.offset = exc.end_offset = None
+        exc.text = linecache.getline(exc.filename, lineno) or None
+
+    for chained in (exc.__cause__, exc.__context__):
+        if chained is not None:
+            _remap(chained, seen)
+    for group_member in getattr(exc, "exceptions", None) or ():
+        _remap(group_member, seen)
+
+
+def format_exception(exc_type, value, tb) -> List[str]:
+    """traceback.format_exception with .dopy line numbers"""
+    exc = traceback.TracebackException(exc_type, value, tb)
+    _remap(exc, set())
+    return list(exc.format())
+
+
+def excepthook(exc_type, value, tb) -> None:
+    """sys.excepthook printing tracebacks with .dopy line numbers"""
+    sys.stderr.write("".join(format_exception(exc_type, value, tb)))
+
+
+def install_excepthook() -> None:
+    """Make excepthook the hook for uncaught exceptions"""
+    sys.excepthook = excepthook
+
+
+def program_traceback(value: BaseException) -> Optional[TracebackType]:
+    """The traceback of value from its first frame in a registered module"""
+    tb = value.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename not in _line_maps:
+        tb = tb.tb_next
+    return tb
+
+
+def in_dopy_code(value: BaseException) -> bool:
+    """Whether value was raised by, or compiling, a registered module"""
+    if isinstance(value, SyntaxError) and value.filename in _line_maps:
+        return True
+    return program_traceback(value) is not None
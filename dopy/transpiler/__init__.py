@@ -1,17 +1,41 @@
 # dopy/dopy/transpiler/__init__.py
 from pathlib import Path
+from typing import Optional
+from dopy.cache import TranspileCache
 from .collector import DopyImportCollector
-from .processor import DopyProcessor
+from .processor import DopyProcessor, FileResult
 
+# Served from .aio on first use, importing asyncio costs more than the
+# rest of the transpiler together
+_ASYNC_API = ("aiter_results", "aprocess_with_imports")
 
-def process_with_imports(target: str, project_root: Path = None) -> bool:
-    """Main entry point for transpilation with imports"""
+
+def __getattr__(name: str):
+    if name in _ASYNC_API:
+        from . import aio
+
+        return getattr(aio, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def process_with_imports(
+    target: str,
+    project_root: Path = None,
+    cache: Optional[TranspileCache] = None,
+    max_workers: Optional[int] = None,
+) -> bool:
+    """
+    Main entry point for transpilation with imports
+
+    The whole import graph is collected first, which lets the processor
+    pick its backend, bound its queue and start the largest files first
+    for the complete set.
+    """
     target_path = Path(target)
     if project_root is None:
         project_root = target_path.parent
 
-    collector = DopyImportCollector(project_root)
+    collector = DopyImportCollector(project_root, cache=cache)
+    processor = DopyProcessor(max_workers=max_workers, cache=cache)
     all_files = collector.collect_all_imports(target_path)
-
-    processor = DopyProcessor()
-    return processor.process_all(all_files)
+    return processor.process_all(all_files, sizes=collector.file_sizes())
@@ -0,0 +1,105 @@
+"""
+asyncio counterparts of the transpiler entry points.
+
+Reading, transpiling and writing a file all run together on an executor,
+the loop's default thread pool unless one is given, so the event loop
+never blocks on either CPU or disk. At most `concurrency` files are in
+flight at once and the next ones are only submitted as results are
+consumed. Cancelling stops submitting files and cancels those still
+queued in the executor; files already running finish, and since outputs
+are replaced atomically none is ever left half written.
+"""
+
+import asyncio
+import itertools
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+
+from dopy.cache import TranspileCache
+from .collector import DopyImportCollector
+from .processor import DopyProcessor, FileResult, _run_timed
+
+
+async def aiter_results(
+    files: Iterable[Path],
+    processor: Optional[DopyProcessor] = None,
+    task: Optional[Callable[[Path], Any]] = None,
+    concurrency: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    sizes: Optional[Dict[Path, int]] = None,
+) -> AsyncIterator[FileResult]:
+    """
+    Run task, processor.transpile_file by default, on every file and yield
+    a FileResult for each as it completes. Files start largest first, like
+    in DopyProcessor.iter_results. concurrency defaults to the
+    processor's max_workers. With a process pool as executor task must be
+    picklable, like for DopyProcessor.map_files.
+    """
+    if processor is None:
+        processor = DopyProcessor()
+    if task is None:
+        task = processor.transpile_file
+    limit = processor.max_workers if concurrency is None else concurrency
+    if limit < 1:
+        raise ValueError(f"concurrency must be at least 1, got {limit}")
+
+    loop = asyncio.get_running_loop()
+    # Stat'ing a large tree is I/O too
+    sized = await loop.run_in_executor(None, processor._sizes, set(files), sizes)
+    pending = iter(sized)
+    running = set()
+    try:
+        while True:
+            for file_path, size in itertools.islice(pending, limit - len(running)):
+                running.add(
+                    loop.run_in_executor(executor, _run_timed, task, file_path, size)
+                )
+            if not running:
+                return
+            done, running = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                yield future.result()
+    finally:
+        for future in running:
+            future.cancel()
+
+
+async def aprocess_with_imports(
+    target: str,
+    project_root: Path = None,
+    cache: Optional[TranspileCache] = None,
+    max_workers: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> bool:
+    """
+    process_with_imports without blocking the event loop: collects the
+    import graph of target, then transpiles it through aiter_results.
+    Returns True if all files processed successfully, False otherwise.
+    """
+    target_path = Path(target)
+    if project_root is None:
+        project_root = target_path.parent
+
+    collector = DopyImportCollector(project_root, cache=cache)
+    processor = DopyProcessor(max_workers=max_workers, cache=cache)
+    loop = asyncio.get_running_loop()
+    all_files = await loop.run_in_executor(
+        None, collector.collect_all_imports, target_path
+    )
+
+    success = True
+    async for result in aiter_results(
+        all_files,
+        processor,
+        concurrency=concurrency,
+        executor=executor,
+        sizes=collector.file_sizes(),
+    ):
+        if not result.ok:
+            print(f"Failed to process {result.path}: {result.error}")
+            success = False
+    return success
@@ -1,11 +1,198 @@
 import ast
+import os
+import threading
 from pathlib import Path
-from typing import Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
+from dopy import profiling
+from dopy.cache import TranspileCache
 
 
 class DopyImportCollector:
-    def __init__(self, project_root: Path):
+    """
+    Finds the .dopy files a module imports, directly or not.
+
+    With a cache, the graph is saved between runs: for every file its
+    mtime, size and resolved imports, and for the module index the mtime
+    of every directory it was built from. Adding or removing a file
+    changes the mtime of its directory, which invalidates the index and
+    every resolved import with it. Otherwise unchanged files cost a stat
+    call and aren't read.
+    """
+
+    def __init__(self, project_root: Path, cache: Optional[TranspileCache] = None):
         self.project_root = project_root
+        self.cache = cache
+        # Module name -> .dopy file, built on first use by a single walk
+        self._index: Optional[Dict[str, Path]] = None
+        # .dopy file -> module name, used to anchor relative imports
+        self._modules: Dict[Path, str] = {}
+        # Directory -> mtime_ns of every directory the index was built from
+        self._dirs: Dict[str, int] = {}
+        # .dopy file -> [mtime_ns, size, module names of its .dopy imports]
+        self._files: Dict[str, list] = {}
+        self._loaded = cache is None
+        self._dirty = False
+        self._load_lock = threading.Lock()
+
+    def _build_index(self) -> None:
+        """Index every .dopy file under project_root by module name"""
+        index = {}
+        modules = {}
+        dirs = {}
+        root = Path(self.project_root).resolve()
+        to_visit: List[Tuple[str, Tuple[str, ...]]] = [(str(root), ())]
+        # (st_dev, st_ino) of every directory listed, symlinks may loop back
+        visited: Set[Tuple[int, int]] = set()
+
+        while to_visit:
+            directory, package = to_visit.pop()
+            try:
+                # Taken before listing, so later additions are noticed
+                info = os.stat(directory)
+                if (info.st_dev, info.st_ino) in visited:
+                    continue
+                visited.add((info.st_dev, info.st_ino))
+                if self.cache is not None:
+                    dirs[directory] = info.st_mtime_ns
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                name = entry.name
+                if name.startswith(".") or name == "__pycache__":
+                    continue
+                try:
+                    if entry.is_dir():
+                        to_visit.append((entry.path, package + (name,)))
+                        continue
+                    if not name.endswith(".dopy") or not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                stem = name[: -len(".dopy")]
+                parts = package if stem == "__init__" else package + (stem,)
+                if not parts:
+                    continue
+                path = Path(entry.path)
+                if entry.is_symlink():
+                    path = path.resolve()
+                module_name = ".".join(parts)
+                # Like Python, a package wins over a module of the same name
+                if stem != "__init__" and module_name in index:
+                    continue
+                index[module_name] = path
+                modules[path] = module_name
+
+        self._index = index
+        self._modules = modules
+        if self.cache is not None and dirs != self._dirs:
+            # Imports were resolved against the old index
+            self._dirs = dirs
+            self._files = {}
+            self._dirty = True
+
+    def _ensure_index(self) -> None:
+        if self._index is None:
+            with profiling.phase("index"):
+                self._build_index()
+
+    def invalidate_index(self) -> None:
+        """Forget the file index, so files added since are picked up"""
+        self._index = None
+        self._modules = {}
+
+    def _load_cache(self) -> None:
+        """Adopt the saved graph if no directory changed since it was saved"""
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            with profiling.phase("cache"):
+                saved = self.cache.get_import_graph(self.project_root)
+                try:
+                    dirs = saved["dirs"]
+                    for directory, mtime_ns in dirs.items():
+                        if os.stat(directory).st_mtime_ns != mtime_ns:
+                            return
+                    index = {name: Path(path) for name, path in saved["index"].items()}
+                    files = dict(saved["files"])
+                except (OSError, KeyError, TypeError, ValueError, AttributeError):
+                    return
+            self._dirs = dirs
+            self._files = files
+            if self._index is None:
+                self._index = index
+                self._modules = {path: name for name, path in index.items()}
+
+    def save_cache(self) -> None:
+        """Save the graph found so far, if it changed since it was loaded"""
+        if self.cache is None or not self._dirty or self._index is None:
+            return
+        self._dirty = False
+        with profiling.phase("cache"):
+            self.cache.put_import_graph(
+                self.project_root,
+                {
+                    "dirs": self._dirs,
+                    "index": {name: str(path) for name, path in self._index.items()},
+                    "files": self._files,
+                },
+            )
+
+    def file_sizes(self) -> Dict[Path, int]:
+        """
+        Size of every file whose imports are cached, as of when they were
+        extracted. Empty without a cache.
+        """
+        return {Path(path): entry[1] for path, entry in self._files.items()}
+
+    def _package_of(self, file_path: Path) -> Optional[str]:
+        """Name of the package a .dopy file belongs to, None if unknown"""
+        self._ensure_index()
+        module_name = self._modules.get(file_path)
+        if module_name is None:
+            # Top level modules can't be told apart from files outside the tree
+            if file_path.parent == Path(self.project_root).resolve():
+                return ""
+            return None
+        if file_path.name == "__init__.dopy":
+            return module_name
+        return module_name.rpartition(".")[0]
+
+    def _import_candidates(self, node: ast.AST, file_path: Path) -> List[str]:
+        """Module names an import statement may load"""
+        if isinstance(node, ast.Import):
+            candidates = []
+            for alias in node.names:
+                # 'import a.b.c' also runs a/__init__ and a/b/__init__
+                parts = alias.name.split(".")
+                candidates.extend(".".join(parts[:i]) for i in range(1, len(parts) + 1))
+            return candidates
+
+        if node.level:
+            package = self._package_of(file_path)
+            if package is None:
+                return []
+            package_parts = package.split(".") if package else []
+            if node.level - 1 > len(package_parts):
+                return []
+            base_parts = package_parts[: len(package_parts) - (node.level - 1)]
+            if node.module:
+                base_parts = base_parts + node.module.split(".")
+        elif node.module:
+            base_parts = node.module.split(".")
+        else:
+            return []
+
+        # The module itself, its parent packages, and any submodules named
+        # in 'from module import name'
+        candidates = [".".join(base_parts[:i]) for i in range(1, len(base_parts) + 1)]
+        base = ".".join(base_parts)
+        for alias in node.names:
+            if alias.name != "*":
+                candidates.append(f"{base}.{alias.name}" if base else alias.name)
+        return candidates
 
     def _extract_top_imports(self, content: str) -> Tuple[str, int]:
         """Extract import statements from top of file and return them along with last import line number"""
@@ -39,60 +226,78 @@ class DopyImportCollector:
 
     def _extract_imports(self, file_path: Path) -> Set[Path]:
         """Extract and resolve all potential .dopy imports from file"""
-        with open(file_path) as f:
-            content = f.read()
-
-        # First extract just the import statements
-        import_block, _ = self._extract_top_imports(content)
-
-        imports = set()
-        try:
-            # Parse just the import statements
-            tree = ast.parse(import_block)
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for name in node.names:
-                        candidate = self._try_resolve_dopy_path(name.name)
-                        if candidate:
-                            imports.add(candidate)
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module:  # Handles 'from x import y'
-                        candidate = self._try_resolve_dopy_path(node.module)
-                        if candidate:
-                            imports.add(candidate)
-        except SyntaxError as e:
-            print(f"Warning: Syntax error in import statements of {file_path}: {e}")
-            # Continue with empty imports set if parsing fails
+        stamp = None
+        if self.cache is not None:
+            self._load_cache()
+            try:
+                info = os.stat(file_path)
+                stamp = [info.st_mtime_ns, info.st_size]
+            except OSError:
+                pass
+            entry = self._files.get(str(file_path))
+            if stamp is not None and entry is not None and entry[:2] == stamp:
+                self._ensure_index()
+                index = self._index
+                try:
+                    return {index[name] for name in entry[2]}
+                except (KeyError, TypeError):
+                    pass
+
+        with profiling.phase("collect", files=1) as call:
+            with open(file_path) as f:
+                content = f.read()
+            call.bytes = len(content)
+
+            # First extract just the import statements
+            import_block, _ = self._extract_top_imports(content)
 
+            imports = set()
+            try:
+                # Parse just the import statements
+                tree = ast.parse(import_block)
+                for node in ast.walk(tree):
+                    if isinstance(node, (ast.Import, ast.ImportFrom)):
+                        for module_name in self._import_candidates(node, file_path):
+                            candidate = self._try_resolve_dopy_path(module_name)
+                            if candidate:
+                                imports.add(candidate)
+            except SyntaxError as e:
+                print(f"Warning: Syntax error in import statements of {file_path}: {e}")
+                # Continue with empty imports set if parsing fails, and
+                # don't cache it so the warning shows again
+                stamp = None
+
+        if stamp is not None:
+            names = sorted(self._modules[path] for path in imports)
+            self._files[str(file_path)] = stamp + [names]
+            self._dirty = True
         return imports
 
     def _try_resolve_dopy_path(self, module_name: str) -> Path:
         """Try to find a .dopy file for this import"""
-        # Convert module.submodule to module/submodule.dopy
-        parts = module_name.split(".")
-        relative_path = Path(*parts)
-
-        # Check project directory
-        dopy_path = self.project_root / f"{relative_path}.dopy"
-        if dopy_path.exists():
-            return dopy_path.resolve()
+        self._ensure_index()
+        return self._index.get(module_name)
 
-        return None
-
-    def collect_all_imports(self, entry_point: Path) -> Set[Path]:
-        """Get all .dopy files that need to be processed"""
-        to_process = {entry_point.resolve()}
-        processed = set()
+    def collect_import_graph(self, entry_point: Path) -> Dict[Path, Set[Path]]:
+        """Map every .dopy file reachable from entry_point to the .dopy files it imports"""
+        graph = {}
+        to_process = [entry_point.resolve()]
 
         while to_process:
             current = to_process.pop()
-            if current in processed:
+            if current in graph:
                 continue
 
-            processed.add(current)
             # Only look for imports in .dopy files
             if current.suffix == ".dopy":
-                new_imports = self._extract_imports(current)
-                to_process.update(new_imports - processed)
+                graph[current] = self._extract_imports(current)
+                to_process.extend(graph[current] - graph.keys())
+            else:
+                graph[current] = set()
 
-        return processed
+        self.save_cache()
+        return graph
+
+    def collect_all_imports(self, entry_point: Path) -> Set[Path]:
+        """Get all .dopy files that need to be processed"""
+        return set(self.collect_import_graph(entry_point))
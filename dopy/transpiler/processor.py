@@ -1,48 +1,379 @@
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from operator import itemgetter
 import os
-from typing import Set
-from dopy.core import Dopy
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from dopy import profiling
+from dopy.cache import TranspileCache
+from dopy.core import Dopy, _write_if_changed
+from dopy.exceptions import DopyFileError
+
+# What a task returned for a file, and the message of the error it raised
+TaskResult = Tuple[Any, Optional[str]]
+
+
+class FileResult:
+    """
+    The outcome of one file: status is "ok", or "failed" with the message
+    of the error the task raised. bytes is the size of the source, result
+    whatever the task returned.
+    """
+
+    OK = "ok"
+    FAILED = "failed"
+
+    __slots__ = ("path", "status", "duration", "bytes", "error", "result")
+
+    def __init__(
+        self,
+        path: Path,
+        status: str,
+        duration: float,
+        nbytes: int,
+        error: Optional[str] = None,
+        result: Any = None,
+    ):
+        self.path = path
+        self.status = status
+        self.duration = duration
+        self.bytes = nbytes
+        self.error = error
+        self.result = result
+
+    @property
+    def ok(self) -> bool:
+        return self.status == self.OK
+
+    def __repr__(self):
+        return f"FileResult({str(self.path)!r}, {self.status!r})"
+
+    def to_dict(self) -> Dict[str, Union[str, int, float, None]]:
+        return {
+            "path": str(self.path),
+            "status": self.status,
+            "duration_ms": self.duration * 1000,
+            "bytes": self.bytes,
+            "error": self.error,
+        }
+
+
+def _run_task(task: Callable[[Path], Any], file_path: Path) -> TaskResult:
+    """Run task on a file, returning its result and error message"""
+    try:
+        return task(file_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _file_size(file_path: Path) -> int:
+    """Size of a file in bytes, 0 if it can't be stat'ed"""
+    try:
+        return os.stat(file_path).st_size
+    except OSError:
+        return 0
+
+
+def _run_timed(
+    task: Callable[[Path], Any], file_path: Path, size: Optional[int] = None
+) -> FileResult:
+    """Run task on a file of size bytes, stat'ing it if size is None, timing it"""
+    if size is None:
+        size = _file_size(file_path)
+    start = time.perf_counter()
+    result, error = _run_task(task, file_path)
+    return FileResult(
+        file_path,
+        FileResult.OK if error is None else FileResult.FAILED,
+        time.perf_counter() - start,
+        size,
+        error,
+        result,
+    )
+
+
+def _timed_chunk(task: Callable[[Path], Any], files: List[Path]) -> List[FileResult]:
+    """Process pool task: run task on a batch of files in a worker process"""
+    return [_run_timed(task, file_path) for file_path in files]
 
 
 class DopyProcessor:
-    """Processes multiple .dopy files concurrently"""
+    """
+    Processes multiple .dopy files concurrently.
+
+    Two backends are available. "thread" suits small trees and I/O bound
+    work. "process" gets around the GIL for the CPU bound transpilation of
+    large trees, sending files to worker processes in batches so small
+    files don't pay the IPC cost one at a time. "auto" picks one based on
+    file count and total bytes. queue_depth bounds the tasks submitted but
+    not yet consumed.
+    """
+
+    BACKENDS = ("auto", "thread", "process")
+
+    # Below either threshold a process pool costs more to start than it saves
+    PROCESS_MIN_FILES = 64
+    PROCESS_MIN_BYTES = 1024 * 1024
+
+    # Batches per worker process, more batches balance load better
+    CHUNKS_PER_WORKER = 4
+
+    # On the thread backend files below this size are submitted in batches
+    # of up to TINY_BATCH_BYTES, a future each would cost more than them
+    TINY_FILE_BYTES = 4 * 1024
+    TINY_BATCH_BYTES = 64 * 1024
+
+    # Default tasks in flight per worker, enough to keep workers busy
+    # while results are consumed
+    QUEUE_DEPTH_PER_WORKER = 2
 
-    def __init__(self, max_workers: int = None):
+    def __init__(
+        self,
+        max_workers: int = None,
+        cache: Optional[TranspileCache] = None,
+        backend: str = "auto",
+        queue_depth: Optional[int] = None,
+    ):
+        if backend not in self.BACKENDS:
+            raise ValueError(
+                f"Unknown backend '{backend}', expected one of {self.BACKENDS}"
+            )
+        if queue_depth is not None and queue_depth < 1:
+            raise ValueError(f"queue_depth must be at least 1, got {queue_depth}")
         self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.queue_depth = queue_depth or self.max_workers * self.QUEUE_DEPTH_PER_WORKER
+        self.cache = cache
+        self.backend = backend
+        # Holds no state, shared by every worker thread
+        self.engine = Dopy()
+
+    def _process_cached(self, file_path: Path, output_path: Path) -> None:
+        """Transpile through the cache, skipping preprocess for unchanged sources"""
+        with profiling.phase("read", files=1) as call:
+            try:
+                source = file_path.read_bytes()
+            except OSError as e:
+                raise DopyFileError(str(file_path), "read", e)
+            call.bytes = len(source)
+
+        with profiling.phase("cache"):
+            processed = self.cache.get(source)
+        if processed is None:
+            with profiling.phase("transpile", files=1, nbytes=len(source)):
+                processed = self.engine.preprocess(source.decode("utf-8"))
+            with profiling.phase("cache"):
+                self.cache.put(source, processed)
+
+        with profiling.phase("write", files=1, nbytes=len(processed)):
+            try:
+                _write_if_changed(output_path, processed.encode("utf-8"))
+            except OSError as e:
+                raise DopyFileError(str(output_path), "write", e)
+
+    def transpile_file(self, file_path: Path) -> None:
+        """Transpile a single .dopy file next to itself, raising on failure"""
+        output_path = file_path.with_suffix(".py")
+        if self.cache is None:
+            # Streams read, transpile and write in one go
+            with profiling.phase("transpile", files=1) as call:
+                self.engine.process_file(str(file_path), str(output_path))
+                if profiling.enabled():
+                    call.bytes = os.stat(file_path).st_size
+        else:
+            self._process_cached(file_path, output_path)
 
     def process_file(self, file_path: Path) -> None:
         """Process a single .dopy file"""
         try:
-            dopy = Dopy()  # Each thread gets its own instance
-            output_path = file_path.with_suffix(".py")
-            dopy.process_file(str(file_path), str(output_path))
+            self.transpile_file(file_path)
         except Exception as e:
             print(f"Error processing {file_path}: {e}")
 
-    def process_all(self, files: Set[Path]) -> bool:
+    @staticmethod
+    def _sizes(
+        files: Iterable[Path], known: Optional[Dict[Path, int]] = None
+    ) -> List[Tuple[Path, int]]:
+        """
+        Pair each file with its size in bytes, largest first. Sizes in known
+        are taken as they are, other files are stat'ed, 0 if they can't be.
+        """
+        if known is None:
+            known = {}
+        sized = []
+        for file_path in files:
+            size = known.get(file_path)
+            if size is None:
+                size = _file_size(file_path)
+            sized.append((file_path, size))
+        # Started last, a large file leaves every other worker idle
+        sized.sort(key=itemgetter(1), reverse=True)
+        return sized
+
+    def select_backend(self, file_count: int, total_bytes: int) -> str:
+        """Resolve the "auto" backend for a workload of the given shape"""
+        if self.backend != "auto":
+            return self.backend
+        if (
+            file_count >= self.PROCESS_MIN_FILES
+            and total_bytes >= self.PROCESS_MIN_BYTES
+            and (os.cpu_count() or 1) > 1
+        ):
+            return "process"
+        return "thread"
+
+    def _chunks(
+        self, sized: List[Tuple[Path, int]], workers: int
+    ) -> Iterator[List[Path]]:
+        """Group files into batches of roughly equal total size"""
+        total_bytes = sum(size for _, size in sized)
+        target = max(total_bytes // (workers * self.CHUNKS_PER_WORKER), 1)
+        chunk, chunk_bytes = [], 0
+        for file_path, size in sized:
+            chunk.append(file_path)
+            chunk_bytes += size
+            if chunk_bytes >= target:
+                yield chunk
+                chunk, chunk_bytes = [], 0
+        if chunk:
+            yield chunk
+
+    def _thread_jobs(
+        self, task: Callable[[Path], Any], sized: List[Tuple[Path, int]]
+    ) -> Iterator[Tuple[tuple, List[Path]]]:
         """
-        Process all files concurrently.
-        Returns True if all files processed successfully, False otherwise.
+        Jobs for the thread backend, a file each except for tiny files,
+        which are grouped into batches no larger than the process backend
+        would use, so they stay spread over the workers
         """
-        failed_files = []
+        total_bytes = sum(size for _, size in sized)
+        target = max(total_bytes // (self.max_workers * self.CHUNKS_PER_WORKER), 1)
+        target = min(target, self.TINY_BATCH_BYTES)
+        batch, batch_bytes = [], 0
+        for file_path, size in sized:
+            if size >= self.TINY_FILE_BYTES:
+                yield (_run_timed, task, file_path, size), [file_path]
+                continue
+            batch.append(file_path)
+            batch_bytes += size
+            if batch_bytes >= target:
+                yield (_timed_chunk, task, batch), batch
+                batch, batch_bytes = [], 0
+        if batch:
+            yield (_timed_chunk, task, batch), batch
 
-        def process_and_track(file_path: Path):
+    def iter_results(
+        self,
+        files: Iterable[Path],
+        task: Optional[Callable[[Path], Any]] = None,
+        sizes: Optional[Dict[Path, int]] = None,
+    ) -> Iterator[FileResult]:
+        """
+        Run task, transpile_file by default, on every file and yield a
+        FileResult for each as it completes. At most queue_depth tasks, a
+        file or a batch of small files each, are in flight: more are only
+        submitted as results are consumed, so memory stays flat however
+        many files there are. Files are started largest first, with sizes
+        from sizes where known, like the collector's file_sizes(). With
+        the process backend task must be picklable, like a module level
+        function.
+        """
+        if task is None:
+            task = self.transpile_file
+        sized = self._sizes(set(files), sizes)
+        total_bytes = sum(size for _, size in sized)
+
+        if self.select_backend(len(sized), total_bytes) == "process":
+            # Imported on demand, it pulls in all of multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            workers = min(self.max_workers, os.cpu_count() or 1)
+            executor = ProcessPoolExecutor(max_workers=workers)
+            jobs = (
+                ((_timed_chunk, task, chunk), chunk)
+                for chunk in self._chunks(sized, workers)
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            jobs = self._thread_jobs(task, sized)
+
+        with executor:
+            running: Dict[Future, List[Path]] = {}
             try:
-                self.process_file(file_path)
-            except Exception as e:
-                failed_files.append((file_path, str(e)))
-
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Submit all tasks and wait for completion
-            futures = [executor.submit(process_and_track, f) for f in files]
-            # Wait for all futures to complete
-            for future in futures:
-                future.result()  # This will also propagate any exceptions
-
-        if failed_files:
-            for file_path, error in failed_files:
-                print(f"Failed to process {file_path}: {error}")
-            return False
-
-        return True
+                while True:
+                    for job, batch in islice(jobs, self.queue_depth - len(running)):
+                        running[executor.submit(*job)] = batch
+                    if not running:
+                        return
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch = running.pop(future)
+                        try:
+                            results = future.result()
+                        except Exception as e:
+                            # The worker died, none of its batch can be trusted
+                            results = [
+                                FileResult(
+                                    file_path,
+                                    FileResult.FAILED,
+                                    0.0,
+                                    _file_size(file_path),
+                                    str(e),
+                                )
+                                for file_path in batch
+                            ]
+                        if isinstance(results, FileResult):
+                            yield results
+                        else:
+                            yield from results
+            finally:
+                # Abandoned early, don't start what is still queued
+                for future in running:
+                    future.cancel()
+
+    def map_files(
+        self, task: Callable[[Path], Any], files: Iterable[Path]
+    ) -> Dict[Path, TaskResult]:
+        """
+        Run task on every file concurrently, on the backend process_all
+        would use. Maps each file to what task returned for it and the
+        message of the exception it raised, None for whichever didn't
+        happen. With the process backend task and its results must be
+        picklable, like a module level function.
+        """
+        return {
+            result.path: (result.result, result.error)
+            for result in self.iter_results(files, task)
+        }
+
+    def process_all(
+        self,
+        files: Set[Path],
+        on_result: Optional[Callable[[FileResult], None]] = None,
+        sizes: Optional[Dict[Path, int]] = None,
+    ) -> bool:
+        """
+        Process all files concurrently, largest first, passing the
+        FileResult of each to on_result as soon as it completes. Failures
+        are printed as they happen. Returns True if all files processed
+        successfully, False otherwise.
+        """
+        success = True
+        for result in self.iter_results(files, sizes=sizes):
+            if on_result is not None:
+                on_result(result)
+            if not result.ok:
+                print(f"Failed to process {result.path}: {result.error}")
+                success = False
+        return success
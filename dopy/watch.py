@@ -0,0 +1,126 @@
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple, Union
+
+from dopy.cache import TranspileCache
+from dopy.transpiler.collector import DopyImportCollector
+from dopy.transpiler.processor import DopyProcessor
+
+
+class DopyWatcher:
+    """
+    Keeps transpiled .py files next to their .dopy sources up to date.
+
+    The import graph found by DopyImportCollector stays in memory and the
+    .dopy files in it are polled for changes. Each rebuild re-transpiles
+    only the files that changed, plus any imports they newly pull in.
+    """
+
+    def __init__(
+        self,
+        main_module: Union[str, Path],
+        project_root: Path = None,
+        cache: Optional[TranspileCache] = None,
+        interval: float = 0.5,
+        max_workers: Optional[int] = None,
+    ):
+        self.main_module = Path(main_module).resolve()
+        if project_root is None:
+            project_root = self.main_module.parent
+        self.collector = DopyImportCollector(project_root, cache=cache)
+        self.processor = DopyProcessor(max_workers=max_workers, cache=cache)
+        self.interval = interval
+        self.graph: Dict[Path, Set[Path]] = {}
+        self.stamps: Dict[Path, Tuple[int, int]] = {}
+
+    @staticmethod
+    def _stamp(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reachable(self) -> Set[Path]:
+        """Files reachable from the main module in the current graph"""
+        seen = set()
+        to_visit = [self.main_module]
+        while to_visit:
+            current = to_visit.pop()
+            if current in seen or current not in self.graph:
+                continue
+            seen.add(current)
+            to_visit.extend(self.graph[current])
+        return seen
+
+    def build(self) -> Set[Path]:
+        """Collect the whole import graph and transpile every file in it"""
+        self.graph = self.collector.collect_import_graph(self.main_module)
+        self.stamps = {path: self._stamp(path) for path in self.graph}
+        self.processor.process_all(set(self.graph))
+        return set(self.graph)
+
+    def changed_files(self) -> Set[Path]:
+        """Files whose mtime or size moved since they were last transpiled"""
+        return {
+            path for path, stamp in self.stamps.items() if self._stamp(path) != stamp
+        }
+
+    def rebuild(self, changed: Set[Path]) -> Set[Path]:
+        """Re-transpile changed files and any newly discovered imports"""
+        # Changed files may import modules created since the last build
+        self.collector.invalidate_index()
+        to_process = set()
+        to_scan = list(changed)
+        while to_scan:
+            current = to_scan.pop()
+            stamp = self._stamp(current)
+            if stamp is None:
+                # Deleted, keep watching in case it comes back
+                self.graph[current] = set()
+                self.stamps[current] = None
+                continue
+            self.stamps[current] = stamp
+            try:
+                imports = self.collector._extract_imports(current)
+            except (OSError, UnicodeDecodeError) as e:
+                # Undecodable, or deleted mid-scan: retried once it changes
+                print(f"Failed to process {current}: {e}")
+                self.graph.setdefault(current, set())
+                continue
+            self.graph[current] = imports
+            to_process.add(current)
+            to_scan.extend(self.graph[current] - self.graph.keys())
+
+        # Forget files that nothing imports anymore
+        reachable = self._reachable()
+        for path in set(self.graph) - reachable:
+            del self.graph[path]
+            del self.stamps[path]
+
+        to_process &= reachable
+        self.collector.save_cache()
+        if to_process:
+            self.processor.process_all(to_process)
+        return to_process
+
+    def run(self) -> None:
+        """Build once, then rebuild on every change until interrupted"""
+        start = time.perf_counter()
+        built = self.build()
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"Built {len(built)} file(s) in {elapsed:.1f} ms, watching for changes")
+
+        try:
+            while True:
+                time.sleep(self.interval)
+                changed = self.changed_files()
+                if not changed:
+                    continue
+                start = time.perf_counter()
+                rebuilt = self.rebuild(changed)
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"Rebuilt {len(rebuilt)} file(s) in {elapsed:.1f} ms")
+        except KeyboardInterrupt:
+            pass
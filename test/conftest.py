@@ -5,8 +5,9 @@ from dopy.core import Dopy
 @pytest.fixture(scope="class")
 def dopy():
     """
-    Class-scoped fixture providing a shared Dopy instance.
+    Class-scoped fixture providing a Dopy instance.
     Available to all test modules in the test directory and subdirectories.
+    The engine keeps no state between calls, so nothing needs resetting.
 
     Returns:
         Dopy: A Dopy preprocessor instance
@@ -15,11 +16,21 @@ def dopy():
         def test_something(self, dopy):
             result = dopy.preprocess("some code")
     """
-    dopy_instance = Dopy()
-    yield dopy_instance
-    # Reset state after each test class
-    dopy_instance.indent_level = 0
-    dopy_instance.indent_stack = []
-    dopy_instance.paren_level = 0
-    dopy_instance.in_multiline_string = False
-    dopy_instance.quote_char = None
+    return Dopy()
+
+
+@pytest.fixture
+def source():
+    """A small dopy module that transpiles cleanly."""
+    return "def f(x) do\n    return x\nend\n"
+
+
+@pytest.fixture
+def tree(tmp_path, source):
+    """Ten dopy modules in tmp_path, each one larger than the last."""
+    files = set()
+    for i in range(10):
+        path = tmp_path / f"module_{i}.dopy"
+        path.write_text(source * (i + 1))
+        files.add(path)
+    return files
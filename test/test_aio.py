@@ -0,0 +1,125 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+import pytest
+import dopy.transpiler
+from dopy.transpiler import FileResult
+from dopy.transpiler.processor import DopyProcessor
+
+
+async def collect_async(files, **kwargs):
+    return [r async for r in dopy.transpiler.aiter_results(files, **kwargs)]
+
+
+def collect(files, **kwargs):
+    return asyncio.run(collect_async(files, **kwargs))
+
+
+class TestAiterResults:
+    def test_yields_a_result_per_file(self, dopy, tree):
+        results = collect(tree, processor=DopyProcessor(max_workers=2))
+        assert sorted(r.path for r in results) == sorted(tree)
+        for result in results:
+            assert result.ok and result.error is None
+            assert result.bytes == result.path.stat().st_size
+            assert result.duration >= 0
+            expected = dopy.preprocess(result.path.read_text())
+            assert result.path.with_suffix(".py").read_text() == expected
+        assert set(results[0].to_dict()) == {
+            "path",
+            "status",
+            "duration_ms",
+            "bytes",
+            "error",
+        }
+
+    def test_reports_failures(self, tree):
+        def task(file_path):
+            if file_path.name == "module_3.dopy":
+                raise ValueError("broken")
+            return file_path.name
+
+        results = {r.path.name: r for r in collect(tree, task=task)}
+        assert results["module_3.dopy"].status == FileResult.FAILED
+        assert results["module_3.dopy"].error == "broken"
+        assert results["module_0.dopy"].result == "module_0.dopy"
+
+    def test_respects_concurrency(self, tree):
+        lock = threading.Lock()
+        running = peak = 0
+
+        def task(file_path):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+        assert len(collect(tree, task=task, concurrency=2)) == len(tree)
+        assert peak == 2
+
+    def test_cancelling_stops_submitting_files(self, tree):
+        started = []
+        release = threading.Event()
+
+        def task(file_path):
+            started.append(file_path)
+            release.wait(5)
+
+        async def main():
+            consumer = asyncio.ensure_future(
+                collect_async(tree, task=task, concurrency=2)
+            )
+            while len(started) < 2:
+                await asyncio.sleep(0.01)
+            consumer.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await consumer
+            release.set()
+
+        asyncio.run(main())
+        assert len(started) == 2
+
+    def test_rejects_zero_concurrency(self, tree):
+        with pytest.raises(ValueError):
+            collect(tree, concurrency=0)
+
+
+class TestAprocessWithImports:
+    def test_transpiles_whole_graph(self, dopy, tmp_path, source):
+        (tmp_path / "main.dopy").write_text("import a\n" + source)
+        (tmp_path / "a.dopy").write_text(source)
+        main = tmp_path / "main.dopy"
+        assert asyncio.run(dopy_async(main))
+        for name in ["main", "a"]:
+            text = (tmp_path / f"{name}.dopy").read_text()
+            assert (tmp_path / f"{name}.py").read_text() == dopy.preprocess(text)
+
+    def test_reports_failure(self, tmp_path, capsys, source):
+        main = tmp_path / "main.dopy"
+        main.write_text("import a\n" + source)
+        (tmp_path / "a.dopy").write_text(source)
+        # Nothing can be written over a directory
+        (tmp_path / "a.py").mkdir()
+        assert not asyncio.run(dopy_async(main))
+        assert "Failed to process" in capsys.readouterr().out
+
+    def test_asyncio_is_imported_on_demand(self):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, dopy.transpiler; print('asyncio' in sys.modules)",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        assert result.stdout.strip() == "False"
+
+
+async def dopy_async(main):
+    return await dopy.transpiler.aprocess_with_imports(str(main), max_workers=2)
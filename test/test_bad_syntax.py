@@ -1,4 +1,5 @@
 import pytest
+from dopy.core import Diagnostic
 from dopy.exceptions import DopyUnmatchedBlockError, DopyFileError
 
 
@@ -49,3 +50,42 @@ end  # Extra end statement
             dopy.process_file("nonexistent_file.dopy")
         assert "Could not read file" in str(exc_info.value)
         assert "nonexistent_file.dopy" in str(exc_info.value)
+
+
+class TestCollectErrors:
+    def test_reports_every_error(self, dopy):
+        code = (
+            "def first() do\n"
+            "    pass\n"
+            "end\n"
+            "end\n"
+            "def second() do\n"
+            "    if True do\n"
+            "        pass\n"
+            "    end\n"
+        )
+        assert dopy.collect_errors(code) == [
+            Diagnostic(4, 1, Diagnostic.UNMATCHED_END, "Unmatched 'end' at line 4"),
+            Diagnostic(
+                5,
+                14,
+                Diagnostic.UNCLOSED_DO,
+                "Unclosed 'do' block starting at line 5: 'def second() do'",
+            ),
+        ]
+
+    def test_unclosed_blocks_in_source_order(self, dopy):
+        code = "def outer() do\n    while True do\n        pass\n"
+        assert [(d.line, d.column, d.kind) for d in dopy.collect_errors(code)] == [
+            (1, 13, Diagnostic.UNCLOSED_DO),
+            (2, 16, Diagnostic.UNCLOSED_DO),
+        ]
+
+    def test_first_error_matches_validate_syntax(self, dopy):
+        code = "def outer() do\n    if x do\n        pass\nend\nend\nend\n"
+        with pytest.raises(DopyUnmatchedBlockError) as exc_info:
+            dopy.validate_syntax(code)
+        assert dopy.collect_errors(code)[0].message in str(exc_info.value)
+
+    def test_valid_code(self, dopy):
+        assert dopy.collect_errors("def f() do\r\n    pass\r\nend\r\n") == []
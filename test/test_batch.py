@@ -0,0 +1,97 @@
+import json
+import pytest
+from dopy.batch import expand_targets, run_batch
+from dopy.cli import is_batch
+
+
+@pytest.fixture
+def project(tmp_path, source):
+    (tmp_path / "pkg" / "sub").mkdir(parents=True)
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / "main.dopy").write_text(source)
+    (tmp_path / "pkg" / "util.dopy").write_text(source)
+    (tmp_path / "pkg" / "sub" / "deep.dopy").write_text(source)
+    (tmp_path / "pkg" / "notes.txt").write_text("not a module")
+    (tmp_path / ".hidden" / "skipped.dopy").write_text(source)
+    return tmp_path
+
+
+class TestExpandTargets:
+    def test_directories_are_searched(self, project):
+        files, errors = expand_targets([str(project)])
+        assert errors == []
+        assert [p.relative_to(project).as_posix() for p in files] == [
+            "main.dopy",
+            "pkg/sub/deep.dopy",
+            "pkg/util.dopy",
+        ]
+
+    def test_globs_and_duplicates(self, project):
+        files, errors = expand_targets(
+            [f"{project}/pkg/**/*.dopy", str(project / "pkg" / "util.dopy")]
+        )
+        assert errors == []
+        assert {p.name for p in files} == {"util.dopy", "deep.dopy"}
+
+    def test_bad_targets(self, project):
+        files, errors = expand_targets(
+            [str(project / "missing.dopy"), str(project / "pkg" / "notes.txt")]
+        )
+        assert files == []
+        assert len(errors) == 2
+
+    def test_is_batch(self, project):
+        assert not is_batch([str(project / "main.dopy")])
+        assert is_batch([str(project / "main.dopy")], output_dir="out")
+        assert is_batch([str(project)])
+        assert is_batch(["*.dopy"])
+        assert is_batch(["a.dopy", "b.dopy"])
+
+
+class TestRunBatch:
+    def test_check_summarises_failures(self, project, capsys):
+        (project / "pkg" / "broken.dopy").write_text("def f() do\n    pass\n")
+        assert run_batch("check", [str(project)], max_workers=2) == 1
+        out = capsys.readouterr().out
+        assert "broken.dopy" in out
+        assert "Checked 4 file(s)" in out
+        assert "3 ok, 1 failed" in out
+        assert "broken.dopy:1:9: Unclosed 'do' block" in out
+
+    def test_check_json_lists_every_error(self, project, capsys):
+        broken = project / "pkg" / "broken.dopy"
+        broken.write_text("def f() do\n    pass\nend\nend\nclass A do\n")
+        targets = [str(project), str(project / "missing.dopy")]
+        assert run_batch("check", targets, json_output=True) == 1
+        report = json.loads(capsys.readouterr().out)
+        assert (report["files"], report["ok"], report["failed"]) == (4, 3, 1)
+        assert [(d["path"], d["line"], d["kind"]) for d in report["diagnostics"]] == [
+            (str(broken), 4, "unmatched-end"),
+            (str(broken), 5, "unclosed-do"),
+        ]
+        assert len(report["errors"]) == 1
+
+    def test_check_passes(self, project, capsys):
+        assert run_batch("check", [str(project)]) == 0
+        assert "0 failed" in capsys.readouterr().out
+
+    def test_stdout_to_directory(self, dopy, project, tmp_path_factory):
+        output_dir = tmp_path_factory.mktemp("out")
+        status = run_batch("stdout", [str(project)], output_dir=str(output_dir))
+        assert status == 0
+        deep = output_dir / "pkg" / "sub" / "deep.py"
+        assert deep.read_text().startswith("def f(x):\n    return x\n")
+        assert (output_dir / "main.py").exists()
+
+    def test_stdout_needs_output_dir(self, project):
+        assert run_batch("stdout", [str(project)]) == 1
+
+    def test_keep_transpiles_in_place(self, dopy, project, source):
+        assert run_batch("keep", [str(project / "pkg")]) == 0
+        assert (project / "pkg" / "util.py").read_text() == dopy.preprocess(source)
+        assert (project / "pkg" / "sub" / "deep.py").exists()
+        assert not (project / "main.py").exists()
+
+    def test_missing_target_fails(self, project):
+        targets = [str(project / "main.dopy"), str(project / "missing.dopy")]
+        assert run_batch("check", targets) == 1
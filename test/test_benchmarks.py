@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+from benchmarks import generators
+from benchmarks.run import REPO_ROOT, ArrivalOrderProcessor, compare
+from benchmarks.startup import ENTRY_POINT, SMALL_SOURCE, parse_importtime
+from dopy.transpiler.collector import DopyImportCollector
+
+
+class TestBenchmarkGenerators:
+    def test_sources_transpile(self, dopy):
+        for source in [
+            generators.long_file(20),
+            generators.deep_nesting(10, repeat=2),
+            generators.string_heavy(5, 5),
+            generators.generated_module(5),
+        ]:
+            compile(dopy.preprocess(source), "<benchmark>", "exec")
+
+    def test_import_graph(self, tmp_path):
+        main = generators.import_graph(tmp_path, width=3, depth=4)
+        files = DopyImportCollector(tmp_path).collect_all_imports(main)
+        assert len(files) == 3 * 4 + 1
+
+    def test_skewed_tree(self, tmp_path):
+        files = generators.skewed_tree(tmp_path, small=3, large_functions=500)
+        large = tmp_path / "large.dopy"
+        assert large.stat().st_size > 10 * (tmp_path / "small_0.dopy").stat().st_size
+
+        positions = set()
+        for seed in range(20):
+            sized = ArrivalOrderProcessor(seed=seed)._sizes(files)
+            assert sorted(path for path, _ in sized) == sorted(files)
+            positions.add([path for path, _ in sized].index(large))
+        # Not rigged to start it first, or last
+        assert len(positions) > 2
+
+    def test_compare_flags_regressions(self):
+        baseline = {"fast": {"median": 1.0}, "slow": {"median": 1.0}}
+        current = {"fast": {"median": 1.05}, "slow": {"median": 1.5}}
+        assert compare(baseline, current, threshold=0.1) == ["slow"]
+
+
+class TestStartup:
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   _io\n"
+            "import time:      1500 |       2300 | argparse\n"
+        )
+        assert parse_importtime(stderr) == {"_io": (120, 120), "argparse": (1500, 2300)}
+
+    def test_check_skips_heavy_imports(self, tmp_path):
+        target = tmp_path / "small.dopy"
+        target.write_text(SMALL_SOURCE)
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", ENTRY_POINT, "--check", target],
+            capture_output=True,
+            text=True,
+            cwd=REPO_ROOT,
+            env=dict(os.environ, DOPY_SOCKET=str(tmp_path / "no-daemon.sock")),
+        )
+        assert result.returncode == 0
+        imports = parse_importtime(result.stderr)
+        for heavy in [
+            "autopep8",
+            "concurrent.futures",
+            "dopy.pep8",
+            "dopy.run",
+            "socket",
+            "tempfile",
+        ]:
+            assert heavy not in imports
@@ -0,0 +1,74 @@
+import os
+from dopy.cache import DiskCache, TranspileCache
+from dopy.importer import DopyLoader
+from dopy.transpiler.processor import DopyProcessor
+
+SOURCE = b"def f() do\n    return 1\nend\n"
+
+
+class TestTranspileCache:
+    def test_miss_then_hit(self, tmp_path):
+        cache = TranspileCache(tmp_path)
+        assert cache.get(SOURCE) is None
+        cache.put(SOURCE, "def f():\n    return 1\n")
+        assert cache.get(SOURCE) == "def f():\n    return 1\n"
+        assert cache.get(SOURCE + b"\n") is None
+
+    def test_key_depends_on_version(self, monkeypatch):
+        key = TranspileCache.key(SOURCE)
+        monkeypatch.setattr("dopy.cache.__version__", "999.0.0")
+        assert TranspileCache.key(SOURCE) != key
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        store = DiskCache("test", tmp_path)
+        for i, key in enumerate(["aa01", "aa02", "aa03"]):
+            store.put(key, b"x" * 40)
+            path = store.directory / "aa" / key
+            os.utime(path, (i, i))
+        store.get("aa01")  # refresh the oldest entry
+        store.max_size = 100
+        store.evict()
+        assert store.get("aa01") is not None
+        assert store.get("aa02") is None
+
+    def test_processor_uses_cache(self, dopy, tmp_path):
+        cache = TranspileCache(tmp_path / "cache")
+        module = tmp_path / "module.dopy"
+        module.write_bytes(SOURCE)
+
+        assert DopyProcessor(cache=cache).process_all({module})
+        expected = dopy.preprocess(SOURCE.decode())
+        assert module.with_suffix(".py").read_text() == expected
+        assert cache.get(SOURCE) == expected
+
+        # A hit is served straight from the cache
+        cache.put(SOURCE, "# cached\n")
+        assert DopyProcessor(cache=cache).process_all({module})
+        assert module.with_suffix(".py").read_text() == "# cached\n"
+
+
+class TestBytecodeCache:
+    def test_code_is_validated_against_source(self, tmp_path):
+        cache = TranspileCache(tmp_path)
+        code = compile("x = 1\n", "module.dopy", "exec")
+        assert cache.get_code("module.dopy", SOURCE) is None
+
+        cache.put_code("module.dopy", SOURCE, code)
+        assert cache.get_code("module.dopy", SOURCE) == code
+        assert cache.get_code("module.dopy", SOURCE + b"\n") is None
+        assert cache.get_code("other.dopy", SOURCE) is None
+
+    def test_warm_import_skips_transpile_and_compile(self, tmp_path, monkeypatch):
+        cache = TranspileCache(tmp_path / "cache")
+        module = tmp_path / "module.dopy"
+        module.write_bytes(SOURCE)
+
+        cold = DopyLoader("module", str(module), cache).get_code("module")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("should have been served from the cache")
+
+        monkeypatch.setattr("dopy.importer.Dopy.preprocess", fail)
+        monkeypatch.setattr("dopy.importer.compile", fail, raising=False)
+        warm = DopyLoader("module", str(module), cache).get_code("module")
+        assert warm == cold
@@ -0,0 +1,125 @@
+import os
+from pathlib import Path
+import pytest
+from dopy.cache import TranspileCache
+from dopy.transpiler.collector import DopyImportCollector
+
+
+@pytest.fixture
+def project(tmp_path):
+    files = {
+        "main.dopy": "import os\nimport pkg.sub\nfrom helper import greet\n",
+        "helper.dopy": "def greet() do\n    pass\nend\n",
+        "pkg/__init__.dopy": "from . import sibling\n",
+        "pkg/sub.dopy": "from .sibling import VALUE\nfrom ..helper import greet\n",
+        "pkg/sibling.dopy": "from pkg import deep\nVALUE = 1\n",
+        "pkg/deep/__init__.dopy": "from .leaf import *\n",
+        "pkg/deep/leaf.dopy": "LEAF = 1\n",
+        "unused.dopy": "X = 1\n",
+        ".hidden/ignored.dopy": "X = 1\n",
+    }
+    for name, content in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return tmp_path.resolve()
+
+
+class TestDopyImportCollector:
+    def test_resolves_packages_and_relative_imports(self, project):
+        graph = DopyImportCollector(project).collect_import_graph(project / "main.dopy")
+        names = {
+            path.relative_to(project).as_posix(): {
+                imported.relative_to(project).as_posix() for imported in imports
+            }
+            for path, imports in graph.items()
+        }
+        assert names == {
+            "main.dopy": {"pkg/__init__.dopy", "pkg/sub.dopy", "helper.dopy"},
+            "helper.dopy": set(),
+            "pkg/__init__.dopy": {"pkg/__init__.dopy", "pkg/sibling.dopy"},
+            "pkg/sub.dopy": {"pkg/__init__.dopy", "pkg/sibling.dopy", "helper.dopy"},
+            "pkg/sibling.dopy": {"pkg/__init__.dopy", "pkg/deep/__init__.dopy"},
+            "pkg/deep/__init__.dopy": {
+                "pkg/__init__.dopy",
+                "pkg/deep/__init__.dopy",
+                "pkg/deep/leaf.dopy",
+            },
+            "pkg/deep/leaf.dopy": set(),
+        }
+
+    def test_lookups_do_not_touch_the_filesystem(self, project, monkeypatch):
+        collector = DopyImportCollector(project)
+        collector._build_index()
+
+        def fail(*args, **kwargs):
+            raise AssertionError("unexpected filesystem access")
+
+        monkeypatch.setattr(Path, "exists", fail)
+        monkeypatch.setattr(Path, "resolve", fail)
+        assert collector._try_resolve_dopy_path("os") is None
+        assert collector._try_resolve_dopy_path("pkg.deep.leaf") == (
+            project / "pkg" / "deep" / "leaf.dopy"
+        )
+
+    def test_directory_symlink_loops(self, project):
+        # Two links back up the tree, each would multiply the walk
+        os.symlink("..", project / "pkg" / "up")
+        os.symlink("..", project / "pkg" / "again")
+        collector = DopyImportCollector(project)
+        files = collector.collect_all_imports(project / "main.dopy")
+        assert len(files) == 7
+        assert collector._index["pkg.deep.leaf"] == project / "pkg/deep/leaf.dopy"
+        assert not [name for name in collector._index if ".up" in name]
+        assert not [name for name in collector._index if ".again" in name]
+
+
+def relative_graph(graph, root):
+    return {
+        path.relative_to(root).as_posix(): sorted(
+            imported.relative_to(root).as_posix() for imported in imports
+        )
+        for path, imports in graph.items()
+    }
+
+
+class TestImportGraphCache:
+    def test_warm_run_only_stats(self, project, tmp_path_factory, monkeypatch):
+        cache = TranspileCache(tmp_path_factory.mktemp("cache"))
+        main = project / "main.dopy"
+        cold = DopyImportCollector(project, cache).collect_import_graph(main)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("unexpected parse or directory walk")
+
+        monkeypatch.setattr(DopyImportCollector, "_build_index", fail)
+        monkeypatch.setattr(DopyImportCollector, "_extract_top_imports", fail)
+        monkeypatch.setattr("dopy.transpiler.collector.open", fail, raising=False)
+        warm = DopyImportCollector(project, cache).collect_import_graph(main)
+        assert warm == cold
+
+    def test_changed_file_is_parsed_again(self, project, tmp_path_factory):
+        cache = TranspileCache(tmp_path_factory.mktemp("cache"))
+        main = project / "main.dopy"
+        DopyImportCollector(project, cache).collect_import_graph(main)
+
+        (project / "helper.dopy").write_text("import unused\n# grown\n")
+        graph = DopyImportCollector(project, cache).collect_import_graph(main)
+        assert relative_graph(graph, project)["helper.dopy"] == ["unused.dopy"]
+
+    def test_added_file_invalidates_index(self, project, tmp_path_factory):
+        cache = TranspileCache(tmp_path_factory.mktemp("cache"))
+        main = project / "main.dopy"
+        main.write_text("import extra\n")
+        graph = DopyImportCollector(project, cache).collect_import_graph(main)
+        assert relative_graph(graph, project) == {"main.dopy": []}
+
+        stat = os.stat(project)
+        (project / "extra.dopy").write_text("X = 1\n")
+        # Make sure the directory mtime moves even on coarse clocks
+        os.utime(project, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        graph = DopyImportCollector(project, cache).collect_import_graph(main)
+        assert relative_graph(graph, project) == {
+            "main.dopy": ["extra.dopy"],
+            "extra.dopy": [],
+        }
@@ -0,0 +1,101 @@
+import json
+import os
+import socket
+import threading
+import time
+import pytest
+from dopy.cache import default_cache_dir
+from dopy.cli import check_file, format_file
+from dopy.daemon import DopyDaemon, default_socket_path, forward
+
+SOURCE = "def greet(name) do\n    print(name)\nend\n"
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    server = DopyDaemon(tmp_path / "dopy.sock")
+    server.bind()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.close()
+    thread.join()
+
+
+class TestDopyDaemon:
+    def test_answers_like_the_cli(self, daemon, tmp_path):
+        target = tmp_path / "greet.dopy"
+        target.write_text(SOURCE)
+
+        assert forward("check", target, socket_path=daemon.socket_path) == (
+            check_file(target)
+        )
+        assert forward("stdout", target, socket_path=daemon.socket_path) == (
+            format_file(target)
+        )
+
+    def test_reports_syntax_errors(self, daemon, tmp_path):
+        target = tmp_path / "broken.dopy"
+        target.write_text("def broken() do\n    pass\n")
+
+        status, output = forward("check", target, socket_path=daemon.socket_path)
+        assert status == 1
+        assert "Syntax Error" in output
+
+    def test_sees_changed_files(self, daemon, tmp_path):
+        target = tmp_path / "greet.dopy"
+        target.write_text(SOURCE)
+        forward("stdout", target, socket_path=daemon.socket_path)
+
+        stat = os.stat(target)
+        target.write_text(SOURCE.replace("name", "who"))
+        os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        _, output = forward("stdout", target, socket_path=daemon.socket_path)
+        assert "print(who)" in output
+
+    def test_idle_connection_does_not_block_others(self, daemon, tmp_path):
+        target = tmp_path / "greet.dopy"
+        target.write_text(SOURCE)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as editor:
+            editor.connect(str(daemon.socket_path))
+            start = time.monotonic()
+            result = forward("check", target, socket_path=daemon.socket_path)
+            assert result == check_file(target)
+            assert time.monotonic() - start < 5
+
+    def test_rejects_requests_it_cannot_serve(self, daemon):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(daemon.socket_path))
+            reader = client.makefile("rb")
+            for request in [b"not json\n", b'{"version": "0.0.0"}\n']:
+                client.sendall(request)
+                assert "error" in json.loads(reader.readline())
+
+    def test_refuses_to_start_twice(self, daemon):
+        with pytest.raises(OSError):
+            DopyDaemon(daemon.socket_path).bind()
+
+    def test_replaces_stale_socket(self, tmp_path):
+        path = tmp_path / "dopy.sock"
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(str(path))
+        server = DopyDaemon(path)
+        server.bind()
+        server.close()
+        assert not path.exists()
+
+
+class TestDefaultSocketPath:
+    def test_falls_back_to_cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("DOPY_SOCKET", raising=False)
+        monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+        assert default_socket_path() == default_cache_dir() / "daemon.sock"
+
+
+class TestForward:
+    def test_without_daemon(self, tmp_path):
+        target = tmp_path / "greet.dopy"
+        target.write_text(SOURCE)
+        assert forward("check", target, socket_path=tmp_path / "none.sock") is None
@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+from dopy.core import transpile
+from dopy.exceptions import DopyUnmatchedBlockError
+
+EXAMPLES_DIR = Path(__file__).parent.parent / "examples"
+
+
+class TestSinglePassEngine:
+    @pytest.mark.parametrize(
+        "example", sorted(EXAMPLES_DIR.rglob("*.dopy")), ids=lambda p: p.name
+    )
+    def test_matches_legacy_on_examples(self, dopy, example):
+        code = example.read_text()
+        assert dopy.preprocess(code) == dopy.preprocess_legacy(code)
+
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "x = 1  # a comment\nprint(x)",
+            "def f() do # comment\n  return 1\nend",
+            's = "a string ending in do"\nprint(s)',
+            "if x do\r\n  y = 1\r\nend\r\n",
+            "\n\n# only a comment\n\n",
+        ],
+    )
+    def test_matches_legacy_on_snippets(self, dopy, code):
+        assert dopy.preprocess(code) == dopy.preprocess_legacy(code)
+
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "def f() do\n  pass",
+            "def f() do\n  pass\nend\nend",
+        ],
+    )
+    def test_same_errors_as_legacy(self, dopy, code):
+        with pytest.raises(DopyUnmatchedBlockError) as new_error:
+            dopy.preprocess(code)
+        with pytest.raises(DopyUnmatchedBlockError) as legacy_error:
+            dopy.preprocess_legacy(code)
+        assert str(new_error.value) == str(legacy_error.value)
+
+
+class TestReentrantEngine:
+    def test_interleaved_streams(self, dopy):
+        outer = "def f() do\n    if x do\n        y = 1\n    end\nend\n"
+        inner = "while True do\n    pass\nend\n"
+        first = dopy.preprocess_stream(outer.splitlines())
+        second = dopy.preprocess_stream(inner.splitlines())
+        lines = [next(first), next(first), next(second)]
+        lines += list(second) + list(first)
+        assert lines[:3] == ["def f():", "    if x:", "while True:"]
+        assert "\n".join(lines[2:5]) == dopy.preprocess(inner)
+        assert "\n".join(lines[:2] + lines[5:]) == dopy.preprocess(outer)
+
+    def test_shared_across_threads(self, dopy):
+        sources = [
+            "def f() do\n" + "    if x do\n" * depth + "    end\n" * depth + "end\n"
+            for depth in range(1, 40)
+        ]
+        expected = [dopy.preprocess(source) for source in sources]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            assert list(pool.map(transpile, sources * 4)) == expected * 4
+
+    def test_unclosed_block_message(self, dopy):
+        code = "def f() do\n    if x do\n        pass\n    end\n"
+        with pytest.raises(DopyUnmatchedBlockError) as exc_info:
+            transpile(code)
+        assert "starting at line 1: 'def f() do'" in str(exc_info.value)
+        with pytest.raises(DopyUnmatchedBlockError) as exc_info:
+            list(dopy.preprocess_stream(code.splitlines()))
+        assert str(exc_info.value).endswith("starting at line 1 block")
+
+    def test_unclosed_block_message_from_file(self, dopy, tmp_path):
+        source = tmp_path / "module.dopy"
+        source.write_bytes(b"x = 1\r\nwhile x do\r\n    pass\r\n")
+        with pytest.raises(DopyUnmatchedBlockError) as exc_info:
+            dopy.process_file(str(source))
+        assert "starting at line 2: 'while x do'" in str(exc_info.value)
+
+
+class TestQuoteIndex:
+    @pytest.mark.parametrize(
+        "line, pos, expected",
+        [
+            ("x = 1", 3, False),
+            ("s = 'abc do", 9, True),
+            ("s = 'abc' do", 10, False),
+            ('s = "it\\"s" do', 12, False),
+            ("s = 'a\\\\' do", 10, False),
+            ("s = 'ab", -1, True),
+            ("'", -5, False),
+        ],
+    )
+    def test_in_string(self, dopy, line, pos, expected):
+        assert dopy._is_in_string(line, pos) is expected
@@ -0,0 +1,79 @@
+import sys
+import pytest
+from dopy import importer, sourcemap
+from dopy.run import run_without_files
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """A small project mixing .dopy modules, a .dopy package and a Python package"""
+    (tmp_path / "helper.dopy").write_text("def twice(x) do\n    return x * 2\nend\n")
+    (tmp_path / "dpkg").mkdir()
+    (tmp_path / "dpkg" / "__init__.dopy").write_text("from .inner import VALUE\n")
+    (tmp_path / "dpkg" / "inner.dopy").write_text("VALUE = 21\n")
+    (tmp_path / "pypkg").mkdir()
+    (tmp_path / "pypkg" / "__init__.py").write_text("")
+    (tmp_path / "pypkg" / "mod.dopy").write_text("NAME = 'mod'\n")
+    (tmp_path / "unused.dopy").write_text("this is not valid python do\n")
+
+    monkeypatch.setattr(sys, "path", [str(tmp_path)] + sys.path)
+    monkeypatch.setattr(sys, "meta_path", list(sys.meta_path))
+    for name in ["helper", "dpkg", "dpkg.inner", "pypkg", "pypkg.mod"]:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    return tmp_path
+
+
+class TestImportHook:
+    def test_imports_modules_and_packages(self, project):
+        finder = importer.install([project])
+        try:
+            import helper
+            import dpkg
+            import pypkg.mod
+        finally:
+            importer.uninstall(finder)
+
+        assert helper.twice(4) == 8
+        assert helper.__file__ == str(project / "helper.dopy")
+        assert dpkg.VALUE == 21
+        assert pypkg.mod.NAME == "mod"
+        assert finder not in sys.meta_path
+
+    def test_run_without_files_transpiles_in_memory(self, project, monkeypatch):
+        monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
+        main = project / "main.dopy"
+        main.write_text(
+            "from helper import twice\n"
+            "from dpkg import VALUE\n"
+            "import sys\n"
+            "sys.modules['helper'].result = twice(VALUE)\n"
+        )
+
+        run_without_files(main)
+
+        assert sys.modules["helper"].result == 42
+        # Nothing is written next to the sources, and unused.dopy is never read
+        assert list(project.rglob("*.py")) == [project / "pypkg" / "__init__.py"]
+
+    def test_broken_dependency_names_its_file(self, project, monkeypatch):
+        monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
+        monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+        monkeypatch.delitem(sys.modules, "broken", raising=False)
+        broken = project / "broken.dopy"
+        broken.write_text("def f() do\n    pass\nend\nend\n")
+        main = project / "main.dopy"
+        main.write_text("import broken\n")
+
+        with pytest.raises(SyntaxError) as exc_info:
+            run_without_files(main)
+
+        error = exc_info.value
+        assert (error.filename, error.lineno, error.text) == (str(broken), 4, "end")
+        # What the CLI prints
+        tb = sourcemap.program_traceback(error)
+        text = "".join(sourcemap.format_exception(type(error), error, tb))
+        assert text.startswith(
+            f'Traceback (most recent call last):\n  File "{main}", line 1'
+        )
+        assert f'File "{broken}", line 4\n    end' in text
+        assert "dopy/importer.py" not in text and "dopy/core.py" not in text
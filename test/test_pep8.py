@@ -0,0 +1,117 @@
+import pytest
+from dopy.pep8 import format_code
+
+SOURCES = [
+    """
+import os
+def main() do
+    x=1
+    if x>0 do
+        print( "positive" , x )
+    end
+end
+class Point do
+    def __init__(self,x:int=0,y:int=0) do
+        self.x=x
+        self.y=y
+    end
+    def norm(self) -> float do
+        return (self.x**2+self.y**2)**0.5
+    end
+end
+main()
+""",
+    """
+def outer() do
+    #comment without a space
+    def inner(a, b = 2, *args, **kwargs) do
+        return a+b   # trailing comment
+    end
+    values = [inner(i) for i in range(10) if i%2]
+    lookup = {"a" : 1, "b":2}
+    return values[1:], lookup
+end
+""",
+    """
+def configure(name,
+        value,
+        flag=False) do
+    result = call(name,
+        value)
+    return result
+end
+""",
+    '''
+class Config do
+    """Settings for a run"""
+    def __init__(self) do
+        self.items = []
+    end
+end
+''',
+]
+
+
+class TestFormatCode:
+    def test_spaces_around_operators(self):
+        assert format_code("x=a+b*c\n") == "x = a+b*c\n"
+        assert format_code("x = a+ b\n") == "x = a + b\n"
+        assert format_code("y = x==1\n") == "y = x == 1\n"
+
+    def test_removes_spaces_inside_brackets(self):
+        assert format_code("f( a , b )\n") == "f(a, b)\n"
+        assert format_code("f(a,b)\n") == "f(a, b)\n"
+
+    def test_keyword_arguments(self):
+        assert format_code("f(a = 1)\n") == "f(a=1)\n"
+        source = "def f(a: int=1, b = 2):\n    pass\n"
+        assert format_code(source) == "def f(a: int = 1, b=2):\n    pass\n"
+
+    def test_comments(self):
+        assert format_code("x = 1 # note\n") == "x = 1  # note\n"
+        assert format_code("#note\nx = 1\n") == "# note\nx = 1\n"
+        assert format_code("#!/usr/bin/env python\n") == "#!/usr/bin/env python\n"
+
+    def test_comment_without_trailing_newline(self):
+        assert format_code("x = 1\n\\\n# c") == "x = 1\n# c\n"
+        assert format_code("x = 1\n# c") == "x = 1\n# c\n"
+
+    def test_blank_lines_around_definitions(self):
+        source = "import os\ndef f():\n    pass\nx = 1\n"
+        expected = "import os\n\n\ndef f():\n    pass\n\n\nx = 1\n"
+        assert format_code(source) == expected
+
+    def test_blank_lines_between_methods(self):
+        source = (
+            "class A:\n    def f(self):\n        pass\n    def g(self):\n        pass\n"
+        )
+        expected = (
+            "class A:\n    def f(self):\n        pass\n\n"
+            "    def g(self):\n        pass\n"
+        )
+        assert format_code(source) == expected
+
+    def test_collapses_blank_lines(self):
+        assert format_code("x = 1\n\n\n\n\ny = 2\n\n\n") == "x = 1\n\n\ny = 2\n"
+
+    def test_unexpected_indent_is_dedented(self):
+        assert format_code("x = 1\n    # note\n") == "x = 1\n# note\n"
+
+    def test_continuation_lines(self):
+        source = "result = call(a,\nb)\n"
+        assert format_code(source) == "result = call(a,\n              b)\n"
+
+    def test_multiline_strings_are_kept(self):
+        source = 'x = """a  \n   b\n"""\n'
+        assert format_code(source) == source
+
+    def test_invalid_source_is_only_stripped(self):
+        assert format_code("x = (  \n\n\n") == "x = (\n"
+
+
+class TestMatchesAutopep8:
+    @pytest.mark.parametrize("source", SOURCES)
+    def test_transpiled_output(self, dopy, source):
+        autopep8 = pytest.importorskip("autopep8")
+        processed = dopy.preprocess(source)
+        assert format_code(processed) == autopep8.fix_code(processed)
@@ -0,0 +1,168 @@
+import os
+import time
+import pytest
+from dopy.cache import TranspileCache
+from dopy.transpiler import process_with_imports
+from dopy.transpiler.collector import DopyImportCollector
+from dopy.transpiler.processor import DopyProcessor
+
+
+class TestDopyProcessor:
+    @pytest.mark.parametrize("backend", ["thread", "process"])
+    def test_backends_transpile_every_file(self, dopy, tree, backend):
+        assert DopyProcessor(max_workers=2, backend=backend).process_all(tree)
+        for path in tree:
+            expected = dopy.preprocess(path.read_text())
+            assert path.with_suffix(".py").read_text() == expected
+
+    @pytest.mark.parametrize("cached", [False, True])
+    def test_unchanged_outputs_are_left_alone(self, tree, tmp_path, cached):
+        cache = TranspileCache(tmp_path / "cache") if cached else None
+        processor = DopyProcessor(max_workers=2, cache=cache)
+        assert processor.process_all(tree)
+        for path in tree:
+            os.utime(path.with_suffix(".py"), (0, 0))
+
+        changed = min(tree)
+        changed.write_text("x = 1\n")
+        assert processor.process_all(tree)
+        for path in tree:
+            mtime = os.stat(path.with_suffix(".py")).st_mtime
+            assert (mtime != 0) == (path == changed)
+        assert changed.with_suffix(".py").read_text() == "x = 1"
+        assert not [p for p in changed.parent.iterdir() if p.name.startswith(".")]
+
+    def test_auto_backend_selection(self):
+        processor = DopyProcessor()
+        assert processor.select_backend(10, 10 * 1024 * 1024) == "thread"
+        assert processor.select_backend(10_000, 1024) == "thread"
+        expected = "process" if (os.cpu_count() or 1) > 1 else "thread"
+        assert processor.select_backend(10_000, 10 * 1024 * 1024) == expected
+        assert DopyProcessor(backend="thread").select_backend(10_000, 10**9) == "thread"
+
+    def test_chunks_cover_all_files(self, tree):
+        processor = DopyProcessor()
+        sized = processor._sizes(tree)
+        chunks = list(processor._chunks(sized, workers=2))
+        assert 1 < len(chunks) <= 2 * processor.CHUNKS_PER_WORKER + 1
+        assert sorted(p for chunk in chunks for p in chunk) == sorted(tree)
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            DopyProcessor(backend="gpu")
+
+
+class TestProcessWithImports:
+    @pytest.fixture
+    def chain(self, tmp_path, source):
+        """main -> a -> b, a chain of imports"""
+        (tmp_path / "main.dopy").write_text("import a\n" + source)
+        (tmp_path / "a.dopy").write_text("import b\n" + source)
+        (tmp_path / "b.dopy").write_text(source)
+        return tmp_path
+
+    def test_transpiles_whole_graph(self, dopy, chain):
+        assert process_with_imports(str(chain / "main.dopy"), max_workers=2)
+        for name in ["main", "a", "b"]:
+            expected = dopy.preprocess((chain / f"{name}.dopy").read_text())
+            assert (chain / f"{name}.py").read_text() == expected
+
+    def test_reports_failed_dependency(self, chain, capsys):
+        # Nothing can be written over a directory
+        (chain / "b.py").mkdir()
+        assert not process_with_imports(str(chain / "main.dopy"), max_workers=2)
+        assert f"Failed to process {chain / 'b.dopy'}" in capsys.readouterr().out
+
+
+def fail_on_broken(file_path):
+    if "broken" in file_path.name:
+        raise ValueError(f"cannot handle {file_path.name}")
+    return file_path.name
+
+
+class TestMapFiles:
+    @pytest.mark.parametrize("backend", ["thread", "process"])
+    def test_reports_each_file(self, tree, backend, source):
+        broken = next(iter(tree)).with_name("broken.dopy")
+        broken.write_text(source)
+        processor = DopyProcessor(max_workers=2, backend=backend)
+        results = processor.map_files(fail_on_broken, tree | {broken})
+        assert results.pop(broken) == (None, "cannot handle broken.dopy")
+        assert results == {path: (path.name, None) for path in tree}
+
+
+class TestStreamingResults:
+    @pytest.mark.parametrize("backend", ["thread", "process"])
+    def test_results_stream_to_callback(self, tree, backend):
+        results = []
+        processor = DopyProcessor(max_workers=2, backend=backend)
+        assert processor.process_all(tree, on_result=results.append)
+        assert sorted(r.path for r in results) == sorted(tree)
+        for result in results:
+            assert result.ok
+            assert result.bytes == result.path.stat().st_size
+
+    def test_failures_are_reported(self, tree, capsys, source):
+        broken = next(iter(tree)).with_name("broken.dopy")
+        broken.write_text(source)
+        # Nothing can be written over a directory
+        broken.with_suffix(".py").mkdir()
+        results = []
+        processor = DopyProcessor(max_workers=2)
+        assert not processor.process_all(tree | {broken}, on_result=results.append)
+        assert [r.path for r in results if not r.ok] == [broken]
+        assert f"Failed to process {broken}" in capsys.readouterr().out
+
+    def test_queue_depth_bounds_work_in_flight(self, tree):
+        started = []
+        processor = DopyProcessor(max_workers=4, backend="thread", queue_depth=2)
+        # A task per file, however small
+        processor.TINY_FILE_BYTES = 0
+        results = processor.iter_results(tree, task=started.append)
+        next(results)
+        time.sleep(0.05)
+        # One consumed, at most queue_depth more submitted since
+        assert len(started) <= 3
+        assert len(list(results)) == len(tree) - 1
+        assert len(started) == len(tree)
+
+    def test_invalid_queue_depth(self):
+        with pytest.raises(ValueError):
+            DopyProcessor(queue_depth=0)
+
+
+class TestScheduling:
+    def test_largest_files_start_first(self, tree):
+        started = []
+        processor = DopyProcessor(max_workers=1, backend="thread")
+        processor.TINY_FILE_BYTES = 0
+        for _ in processor.iter_results(tree, task=started.append):
+            pass
+        sizes = [path.stat().st_size for path in started]
+        assert sizes == sorted(sizes, reverse=True)
+
+    def test_known_sizes_are_trusted(self, tree):
+        smallest = min(tree, key=lambda path: path.stat().st_size)
+        sized = DopyProcessor._sizes(tree, {smallest: 10**6})
+        assert sized[0] == (smallest, 10**6)
+        assert len(sized) == len(tree)
+
+    def test_tiny_files_are_batched(self, tmp_path, tree, source):
+        large = tmp_path / "large.dopy"
+        large.write_text(source * 200)
+        processor = DopyProcessor(max_workers=2, backend="thread")
+        sized = processor._sizes(tree | {large})
+        jobs = [batch for _, batch in processor._thread_jobs(fail_on_broken, sized)]
+        assert jobs[0] == [large]
+        assert len(jobs) < len(tree) + 1
+        assert sorted(p for batch in jobs for p in batch) == sorted(tree | {large})
+
+        results = processor.map_files(fail_on_broken, tree | {large})
+        assert results == {path: (path.name, None) for path in tree | {large}}
+
+    def test_collector_sizes(self, tmp_path, source):
+        (tmp_path / "main.dopy").write_text("import a\n" + source)
+        (tmp_path / "a.dopy").write_text(source)
+        collector = DopyImportCollector(tmp_path, TranspileCache(tmp_path / "cache"))
+        files = collector.collect_all_imports(tmp_path / "main.dopy")
+        assert collector.file_sizes() == {path: path.stat().st_size for path in files}
@@ -0,0 +1,39 @@
+import json
+from dopy import profiling
+from dopy.transpiler.processor import DopyProcessor
+
+
+class TestProfiling:
+    def test_phase_is_a_no_op_when_disabled(self):
+        with profiling.phase("transpile", files=1) as call:
+            call.bytes = 10
+        assert not profiling.enabled()
+
+    def test_records_transpiler_phases(self, tmp_path):
+        module = tmp_path / "module.dopy"
+        module.write_text("def f() do\n    pass\nend\n")
+
+        profiler = profiling.enable()
+        try:
+            DopyProcessor(backend="thread").process_all({module})
+        finally:
+            profiling.disable()
+
+        transpile = profiler.phases["transpile"]
+        assert transpile.calls == 1
+        assert transpile.files == 1
+        assert transpile.bytes == module.stat().st_size
+        assert transpile.wall >= 0
+
+    def test_report_and_json(self, tmp_path):
+        profiler = profiling.Profiler()
+        with profiler.phase("collect", files=2, nbytes=100):
+            pass
+        assert "collect" in profiler.report().splitlines()[1]
+
+        output = tmp_path / "profile.json"
+        profiler.write_json(output)
+        data = json.loads(output.read_text())
+        assert data["phases"]["collect"]["files"] == 2
+        assert data["phases"]["collect"]["bytes"] == 100
+        assert "wall_ms" in data["total"]
@@ -0,0 +1,104 @@
+import sys
+from array import array
+import pytest
+from dopy import sourcemap
+from dopy.cache import TranspileCache
+from dopy.importer import DopyLoader
+from dopy.run import run_module
+
+SOURCE = """def helper(x) do
+
+    # divides
+
+    return 1 / x
+end
+
+
+helper(0)
+"""
+
+
+def load(path, cache=None):
+    """Execute the module at path, returning the exception it raised"""
+    code = DopyLoader("module", str(path), cache).get_code("module")
+    try:
+        exec(code, {"__name__": "module"})
+    except Exception as e:
+        return e
+    raise AssertionError("the module should have raised")
+
+
+class TestLineMap:
+    def test_preprocess_fills_line_map(self, dopy):
+        line_map = array("I")
+        processed = dopy.preprocess(SOURCE, line_map)
+        assert len(line_map) == len(processed.split("\n"))
+        assert list(line_map) == [1, 3, 5, 6, 9]
+        assert dopy.line_table(SOURCE) == line_map
+
+    def test_unchanged_output(self, dopy):
+        assert dopy.preprocess(SOURCE, array("I")) == dopy.preprocess(SOURCE)
+
+
+class TestTracebacks:
+    def test_frames_point_at_dopy_lines(self, tmp_path):
+        module = tmp_path / "module.dopy"
+        module.write_text(SOURCE)
+        error = load(module)
+
+        text = "".join(
+            sourcemap.format_exception(type(error), error, error.__traceback__)
+        )
+        assert f'File "{module}", line 9, in <module>\n    helper(0)' in text
+        assert f'File "{module}", line 5, in helper\n    return 1 / x' in text
+        assert sourcemap.in_dopy_code(error)
+        tb = sourcemap.program_traceback(error)
+        assert tb.tb_frame.f_code.co_filename == str(module)
+
+    def test_frames_without_end_positions(self, tmp_path, monkeypatch):
+        # Python 3.10's FrameSummary doesn't take end_lineno
+        monkeypatch.setattr(sourcemap, "_FRAME_POSITIONS", False)
+        module = tmp_path / "module.dopy"
+        module.write_text(SOURCE)
+        error = load(module)
+        text = "".join(
+            sourcemap.format_exception(type(error), error, error.__traceback__)
+        )
+        assert f'File "{module}", line 5, in helper\n    return 1 / x' in text
+
+    def test_syntax_errors_point_at_dopy_lines(self, tmp_path):
+        module = tmp_path / "module.dopy"
+        module.write_text("\n\nx = 1\n\ny = (\n")
+        with pytest.raises(SyntaxError) as exc_info:
+            DopyLoader("module", str(module)).get_code("module")
+
+        error = exc_info.value
+        text = "".join(sourcemap.format_exception(type(error), error, None))
+        assert f'File "{module}", line 5\n    y = (' in text
+
+    def test_line_map_is_cached_with_the_code(self, tmp_path, monkeypatch):
+        cache = TranspileCache(tmp_path / "cache")
+        module = tmp_path / "module.dopy"
+        module.write_text(SOURCE)
+        DopyLoader("module", str(module), cache).get_code("module")
+        sourcemap._line_maps.clear()
+
+        def fail(*args, **kwargs):
+            raise AssertionError("should have been served from the cache")
+
+        monkeypatch.setattr("dopy.importer.Dopy.preprocess", fail)
+        monkeypatch.setattr("dopy.importer.Dopy.line_table", fail)
+        error = load(module, cache)
+        text = "".join(
+            sourcemap.format_exception(type(error), error, error.__traceback__)
+        )
+        assert f'File "{module}", line 5, in helper' in text
+
+    def test_run_module_installs_hook(self, tmp_path, monkeypatch):
+        module = tmp_path / "script.py"
+        module.write_text("x = 1\n")
+        monkeypatch.setattr(sys, "excepthook", sys.__excepthook__)
+        monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
+        monkeypatch.setattr(sys, "path", list(sys.path))
+        run_module(str(module))
+        assert sys.excepthook is sourcemap.excepthook
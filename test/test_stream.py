@@ -0,0 +1,109 @@
+import io
+import stat
+import pytest
+from dopy.exceptions import DopyFileError, DopyUnmatchedBlockError
+
+SOURCE = """
+def greet(name) do
+    # say hello
+    print(f"hello {name}")
+end
+
+greet("world")
+"""
+
+
+class TestPreprocessStream:
+    def test_matches_preprocess(self, dopy):
+        expected = dopy.preprocess(SOURCE)
+        assert "\n".join(dopy.preprocess_stream(io.StringIO(SOURCE))) == expected
+
+    def test_accepts_lines_with_any_line_ending(self, dopy):
+        lines = SOURCE.replace("\n", "\r\n").splitlines(keepends=True)
+        assert "\n".join(dopy.preprocess_stream(lines)) == dopy.preprocess(SOURCE)
+
+    def test_yields_before_input_is_exhausted(self, dopy):
+        def source():
+            yield "if True do\n"
+            yield "    x = 1\n"
+            raise AssertionError("read too far ahead")
+
+        stream = dopy.preprocess_stream(source())
+        assert next(stream) == "if True:"
+        assert next(stream) == "    x = 1"
+
+    def test_process_file_writes_output(self, dopy, tmp_path):
+        source = tmp_path / "module.dopy"
+        source.write_bytes(SOURCE.replace("\n", "\r\n").encode())
+        output = tmp_path / "module.py"
+
+        assert dopy.process_file(str(source), str(output)) is True
+        assert output.read_text() == dopy.preprocess(SOURCE)
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "module.dopy",
+            "module.py",
+        ]
+
+    def test_process_file_keeps_old_output_on_error(self, dopy, tmp_path):
+        source = tmp_path / "module.dopy"
+        source.write_text("def broken() do\n    pass\n")
+        output = tmp_path / "module.py"
+        output.write_text("previous")
+
+        with pytest.raises(DopyUnmatchedBlockError):
+            dopy.process_file(str(source), str(output))
+        assert output.read_text() == "previous"
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "module.dopy",
+            "module.py",
+        ]
+
+    @pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+    def test_process_file_returns_output(self, dopy, tmp_path, newline):
+        source = tmp_path / "module.dopy"
+        source.write_bytes(SOURCE.replace("\n", newline).encode())
+        assert dopy.process_file(str(source)) == dopy.preprocess(SOURCE)
+
+    def test_process_file_large_output(self, dopy, tmp_path):
+        code = "def f() do\n    return 'é'\nend\n" * 5000
+        source = tmp_path / "module.dopy"
+        source.write_text(code, encoding="utf-8")
+        output = tmp_path / "module.py"
+
+        assert dopy.process_file(str(source), str(output)) is True
+        assert output.read_text(encoding="utf-8") == dopy.preprocess(code)
+
+    def test_process_file_empty(self, dopy, tmp_path):
+        source = tmp_path / "module.dopy"
+        source.write_bytes(b"")
+        assert dopy.process_file(str(source)) == ""
+
+    def test_process_file_invalid_utf8(self, dopy, tmp_path):
+        source = tmp_path / "module.dopy"
+        source.write_bytes(b"x = 1\ny = '\xff'\n")
+        with pytest.raises(DopyFileError) as exc_info:
+            dopy.process_file(str(source), str(tmp_path / "module.py"))
+        assert "Could not read file" in str(exc_info.value)
+        assert not (tmp_path / "module.py").exists()
+
+    def test_process_file_keeps_output_mode(self, dopy, tmp_path):
+        source = tmp_path / "module.dopy"
+        source.write_text(SOURCE)
+        output = tmp_path / "module.py"
+        output.write_text("stale\n")
+        output.chmod(0o755)
+        assert dopy.process_file(str(source), str(output)) is True
+        assert output.read_text() == dopy.preprocess(SOURCE)
+        assert stat.S_IMODE(output.stat().st_mode) == 0o755
+
+    def test_process_file_writes_through_symlink(self, dopy, tmp_path):
+        source = tmp_path / "module.dopy"
+        source.write_text(SOURCE)
+        target = tmp_path / "build" / "module.py"
+        target.parent.mkdir()
+        target.write_text("stale\n")
+        link = tmp_path / "module.py"
+        link.symlink_to(target)
+        assert dopy.process_file(str(source), str(link)) is True
+        assert link.is_symlink()
+        assert target.read_text() == dopy.preprocess(SOURCE)
@@ -0,0 +1,62 @@
+import os
+from dopy.watch import DopyWatcher
+
+
+def touch(path, content):
+    """Rewrite path and move its mtime forward so the change is always visible"""
+    stat = os.stat(path) if path.exists() else None
+    if isinstance(content, bytes):
+        path.write_bytes(content)
+    else:
+        path.write_text(content)
+    if stat is not None:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+class TestDopyWatcher:
+    def test_rebuilds_only_changed_files(self, tmp_path):
+        main = tmp_path / "main.dopy"
+        main.write_text("import helper\nhelper.greet()\n")
+        (tmp_path / "helper.dopy").write_text("def greet() do\n    pass\nend\n")
+        (tmp_path / "extra.dopy").write_text("X = 1\n")
+
+        watcher = DopyWatcher(main)
+        assert {p.name for p in watcher.build()} == {"main.dopy", "helper.dopy"}
+        assert watcher.changed_files() == set()
+
+        touch(tmp_path / "helper.dopy", "def greet() do\n    return 1\nend\n")
+        changed = watcher.changed_files()
+        assert {p.name for p in changed} == {"helper.dopy"}
+        assert watcher.rebuild(changed) == changed
+        assert "return 1" in (tmp_path / "helper.py").read_text()
+
+    def test_picks_up_new_imports(self, tmp_path):
+        main = tmp_path / "main.dopy"
+        main.write_text("print('hi')\n")
+        (tmp_path / "extra.dopy").write_text("X = 1\n")
+
+        watcher = DopyWatcher(main)
+        watcher.build()
+        assert not (tmp_path / "extra.py").exists()
+
+        touch(main, "import extra\nprint(extra.X)\n")
+        rebuilt = watcher.rebuild(watcher.changed_files())
+        assert {p.name for p in rebuilt} == {"main.dopy", "extra.dopy"}
+        assert (tmp_path / "extra.py").exists()
+
+    def test_keeps_watching_after_unreadable_file(self, tmp_path, capsys):
+        main = tmp_path / "main.dopy"
+        main.write_text("import helper\nx = 1\n")
+        helper = tmp_path / "helper.dopy"
+        helper.write_text("y = 1\n")
+        watcher = DopyWatcher(main)
+        watcher.build()
+
+        touch(helper, b"y = '\xff'\n")
+        assert watcher.rebuild(watcher.changed_files()) == set()
+        assert f"Failed to process {helper}" in capsys.readouterr().out
+        assert helper in watcher.graph
+
+        touch(helper, "y = 2\n")
+        assert watcher.rebuild(watcher.changed_files()) == {helper}
+        assert helper.with_suffix(".py").read_text() == "y = 2"